@@ -0,0 +1,68 @@
+"""Compare two sets of results written by run.py.
+
+Prints each measurement in both sets, and the ratio of the second to the
+first; ratios above the threshold are marked as regressions, and make the
+exit status 1::
+
+    python benchmarks/compare.py before.json after.json --threshold 1.1
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Any
+
+
+def measurements(results: dict[str, Any]) -> dict[str, float]:
+    """Return the median of each measurement in *results*, by name."""
+    values = {f'micro/{name}': result['median_us']
+              for name, result in results.get('micro', {}).items()}
+    values.update({f'build/{name}': result['median_s']
+                   for name, result in results.get('builds', {}).items()})
+    return values
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='the ratio above which a measurement is a regression')
+    args = parser.parse_args()
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+
+    for results, filename in ((before, args.before), (after, args.after)):
+        metadata = results.get('metadata', {})
+        print(f"{filename}: commit {metadata.get('commit')}, "
+              f"{metadata.get('pages')} pages, Python {metadata.get('python')}, "
+              f"Sphinx {metadata.get('sphinx')}")
+    if before.get('metadata', {}).get('docset') != after.get('metadata', {}).get('docset'):
+        print('warning: the results were measured on different documentation sets')
+    print()
+
+    before_values = measurements(before)
+    after_values = measurements(after)
+    width = max(map(len, before_values.keys() | after_values.keys()), default=0)
+    regressions = 0
+    for name in sorted(before_values.keys() | after_values.keys()):
+        old = before_values.get(name)
+        new = after_values.get(name)
+        if old is None or new is None:
+            print(f'{name:<{width}}  {old!s:>12}  {new!s:>12}')
+            continue
+        ratio = new / old if old else float('inf')
+        marker = ''
+        if ratio > args.threshold:
+            marker = '  regression'
+            regressions += 1
+        print(f'{name:<{width}}  {old:12.2f}  {new:12.2f}  {ratio:6.2f}x{marker}')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
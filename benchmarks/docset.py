@@ -0,0 +1,176 @@
+"""Generate synthetic Sphinx projects for benchmarking.
+
+The projects are shaped like the Linaro documentation the builders are used
+for: a tree of toctrees, pages with external links that html_link_mappings
+maps to Hub paths, relative links, highlighted code with HTML entities,
+inline literals and images with encoded alt text::
+
+    python benchmarks/docset.py /tmp/docset --pages 2000 --depth 3 --width 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import os
+from os import path
+from pathlib import Path
+
+CONF = """\
+project = 'synthetic'
+extensions = ['sphinxcontrib.serializinghtml']
+
+LINK_MAPPINGS = {link_mappings!r}
+
+def setup(app):
+    app.add_config_value('html_project_name', 'synthetic', 'html')
+    app.add_config_value('html_link_mappings', LINK_MAPPINGS, 'html')
+"""
+
+CODE_BLOCK = """\
+.. code-block:: python
+
+   def check_{number}(a, b):
+       # compare <tags> & "entities" like &amp; and &lt;
+       return a < b and "<tag>" != '&amp;'
+
+"""
+
+IMAGE = """\
+.. image:: https://example.org/images/diagram-{number}.png
+   :alt: a &lt; b &amp; c for figure {number}
+
+"""
+
+PARAGRAPH = ("Lorem ipsum dolor sit amet, <consectetur> & adipiscing elit, sed do "
+             "eiusmod tempor ``inline & <literal>`` incididunt ut labore et dolore.\n\n")
+
+
+@dataclasses.dataclass
+class DocsetOptions:
+    #: the number of pages, not counting the toctree index pages
+    pages: int = 200
+    #: the number of levels of toctree index pages
+    depth: int = 2
+    #: the number of entries in each toctree index page
+    width: int = 8
+    #: the number of links in each page, alternating between external links
+    #: (mapped by html_link_mappings) and links to other pages
+    links: int = 10
+    #: the number of code blocks in each page
+    code_blocks: int = 3
+    #: the number of images in each page
+    images: int = 2
+    #: the number of paragraphs of text in each page
+    paragraphs: int = 10
+    #: the number of html_link_mappings entries
+    link_mappings: int = 20
+
+
+def link_mappings(options: DocsetOptions) -> dict[str, str]:
+    return {f'https://docs.example.org/project{number}/': f'project{number}'
+            for number in range(options.link_mappings)}
+
+
+def page_names(options: DocsetOptions) -> list[str]:
+    """Return the document names of the pages, spread over the directories
+    of the toctree tree.
+    """
+    directories = ['']
+    for _ in range(options.depth - 1):
+        directories = [f'{directory}s{number}/' for directory in directories
+                       for number in range(options.width)]
+    return [f'{directories[number % len(directories)]}page{number}'
+            for number in range(options.pages)]
+
+
+def page_source(number: int, docname: str, docnames: list[str],
+                options: DocsetOptions) -> str:
+    title = f'Page {number}'
+    parts = [f'{title}\n{"=" * len(title)}\n\n']
+    mappings = max(options.link_mappings, 1)
+    for link in range(options.links):
+        if link % 2:
+            target = docnames[(number + link) % len(docnames)]
+            parts.append(f':doc:`Link {link} </{target}>` ')
+        else:
+            parts.append(f'`External {link} <https://docs.example.org/project'
+                         f'{(number + link) % mappings}/guide/page{link}.html>`_ ')
+    parts.append('\n\n')
+    for block in range(max(options.code_blocks, options.images, options.paragraphs)):
+        if block < options.paragraphs:
+            parts.append(PARAGRAPH)
+        if block < options.code_blocks:
+            parts.append(CODE_BLOCK.format(number=f'{number}_{block}'))
+        if block < options.images:
+            parts.append(IMAGE.format(number=f'{number}_{block}'))
+    return ''.join(parts)
+
+
+def toctree(entries: list[str], caption: str | None = None) -> str:
+    lines = ['.. toctree::\n']
+    if caption:
+        lines.append(f'   :caption: {caption}\n')
+    lines.append('\n')
+    lines.extend(f'   {entry}\n' for entry in entries)
+    return ''.join(lines) + '\n'
+
+
+def generate(srcdir: str, options: DocsetOptions | None = None) -> list[str]:
+    """Write a synthetic project to *srcdir*, and return its page names."""
+    options = options or DocsetOptions()
+    docnames = page_names(options)
+    os.makedirs(srcdir, exist_ok=True)
+    Path(srcdir, 'conf.py').write_text(CONF.format(link_mappings=link_mappings(options)),
+                                       encoding='utf-8')
+
+    # index pages for each directory, linking to their pages and
+    # subdirectories
+    children: dict[str, list[str]] = {}
+    for docname in docnames:
+        directory, _, name = docname.rpartition('/')
+        children.setdefault(directory, []).append(name)
+        while directory:
+            parent, _, name = directory.rpartition('/')
+            entry = f'{name}/index'
+            if entry in children.setdefault(parent, []):
+                break
+            children[parent].append(entry)
+            directory = parent
+    for directory, entries in children.items():
+        os.makedirs(path.join(srcdir, directory), exist_ok=True)
+        title = f'Section {directory}' if directory else 'Synthetic documentation'
+        with open(path.join(srcdir, directory, 'index.rst'), 'w', encoding='utf-8') as f:
+            f.write(f'{title}\n{"=" * len(title)}\n\n')
+            f.write(toctree(entries, caption='Contents'))
+
+    for number, docname in enumerate(docnames):
+        Path(srcdir, docname + '.rst').write_text(
+            page_source(number, docname, docnames, options), encoding='utf-8')
+    return docnames
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add an option to *parser* for each of the DocsetOptions."""
+    defaults = DocsetOptions()
+    for field in dataclasses.fields(DocsetOptions):
+        parser.add_argument(f'--{field.name.replace("_", "-")}', type=int,
+                            default=getattr(defaults, field.name))
+
+
+def options_from_arguments(args: argparse.Namespace) -> DocsetOptions:
+    return DocsetOptions(**{field.name: getattr(args, field.name)
+                            for field in dataclasses.fields(DocsetOptions)})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('srcdir')
+    add_arguments(parser)
+    args = parser.parse_args()
+    docnames = generate(args.srcdir, options_from_arguments(args))
+    print(f'{len(docnames)} pages written to {args.srcdir}')
+
+
+if __name__ == '__main__':
+    main()
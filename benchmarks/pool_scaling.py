@@ -0,0 +1,69 @@
+"""Measure how the JSON builder's write phase scales with html_pool_size.
+
+Generates a synthetic documentation set (see docset.py), then builds it with the worker pool
+disabled and with 1, 2, 4, ... worker processes (up to the number of CPUs),
+and prints the wall-clock time of each build and its speedup over the serial
+build::
+
+    python benchmarks/pool_scaling.py --pages 400
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from os import path
+
+import docset
+from sphinx.application import Sphinx
+
+
+def build(srcdir: str, outdir: str, pool_size: int) -> float:
+    """Build *srcdir* from scratch and return the build's wall-clock time."""
+    shutil.rmtree(outdir, ignore_errors=True)
+    start = time.perf_counter()
+    app = Sphinx(srcdir, srcdir, outdir, path.join(outdir, '.doctrees'), 'json',
+                 confoverrides={'html_pool_size': pool_size, 'html_body_cache_size': 0},
+                 status=None, warning=None, freshenv=True)
+    app.build(force_all=True)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    docset.add_arguments(parser)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    sizes = [0]
+    workers = 1
+    while workers <= args.max_workers:
+        sizes.append(workers)
+        workers *= 2
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        srcdir = path.join(tmpdir, 'src')
+        docset.generate(srcdir, docset.options_from_arguments(args))
+        outdir = path.join(tmpdir, 'out')
+        results = [{'pool_size': size, 'seconds': build(srcdir, outdir, size)}
+                   for size in sizes]
+
+    serial = results[0]['seconds']
+    for result in results:
+        result['speedup'] = serial / result['seconds']
+    if args.json:
+        print(json.dumps({'pages': args.pages, 'results': results}, indent=2))
+        return
+    print(f'{args.pages} pages')
+    for result in results:
+        print(f"pool size {result['pool_size']:>3}: {result['seconds']:8.2f}s "
+              f"({result['speedup']:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""Benchmark the builders on a synthetic documentation set.
+
+Generates a documentation set (see docset.py), then measures
+
+* each html_assists function on the page bodies and toctrees of the set, in
+  microseconds per page, and serializing the page contexts;
+* end-to-end builds of the set with the JSON and pickle builders, in seconds.
+
+and writes the results, with the commit and versions they were measured
+with, as JSON to the output file, for compare.py to compare::
+
+    python benchmarks/run.py --pages 500 --output before.json
+    git checkout topic
+    python benchmarks/run.py --pages 500 --output after.json
+    python benchmarks/compare.py before.json after.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import dataclasses
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from os import path
+from typing import TYPE_CHECKING
+
+import docset
+import sphinx
+from bs4 import BeautifulSoup
+from sphinx.application import Sphinx
+
+from sphinxcontrib.serializinghtml import html_assists
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from typing import Any
+
+    from sphinxcontrib.serializinghtml import SerializingHTMLBuilder
+
+
+@dataclasses.dataclass
+class Page:
+    pagename: str
+    page_filename: str
+    body: str
+    toctree_html: str
+    toctree_nodes: Any
+    context: dict[str, Any]
+
+
+def harvest(srcdir: str, outdir: str,
+            parser: str) -> tuple[SerializingHTMLBuilder, list[Page]]:
+    """Build *srcdir* with the JSON builder, and return the builder and the
+    pages as they were before the builder post-processed them.
+    """
+    pages: list[Page] = []
+
+    def collect(app: Sphinx, pagename: str, templatename: str, ctx: dict,
+                doctree: Any) -> None:
+        if 'body' not in ctx:
+            return
+        builder = app.builder
+        context = {key: value for key, value in ctx.items() if not callable(value)}
+        pages.append(Page(
+            pagename=pagename,
+            page_filename=builder.get_page_filename(pagename),
+            body=ctx['body'],
+            toctree_html=builder._get_local_toctree(pagename, includehidden=True),
+            toctree_nodes=builder.get_local_toctree_nodes(pagename, includehidden=True),
+            context=copy.deepcopy(context),
+        ))
+
+    app = Sphinx(srcdir, srcdir, outdir, path.join(outdir, '.doctrees'), 'json',
+                 confoverrides={'html_body_cache_size': 0, 'html_parser_backend': parser},
+                 status=None, warning=None, freshenv=True)
+    app.connect('html-page-context', collect)
+    app.build(force_all=True)
+    return app.builder, pages  # type: ignore[return-value]
+
+
+def measure(func: Callable[[], Any], repeat: int, calls: int) -> dict[str, float]:
+    """Time *func*, which makes *calls* calls of the function measured, and
+    return the per-call times in microseconds.
+    """
+    times = [seconds / calls * 1e6
+             for seconds in timeit.repeat(func, number=1, repeat=repeat)]
+    return {'min_us': min(times), 'median_us': statistics.median(times), 'calls': calls}
+
+
+def micro_benchmarks(builder: SerializingHTMLBuilder, pages: list[Page],
+                     repeat: int) -> dict[str, dict[str, float]]:
+    rewriter = html_assists.LinkRewriter(builder.link_mappings)
+    hrefs = [(link['href'], page.page_filename) for page in pages
+             for link in BeautifulSoup(page.body, 'html.parser').find_all('a', href=True)]
+    secnumber_suffix = builder.config.html_secnumber_suffix
+
+    def over_bodies(func: Callable[[Page], Any]) -> Callable[[], None]:
+        def run() -> None:
+            for page in pages:
+                func(page)
+        return run
+
+    benchmarks: dict[str, tuple[Callable[[], Any], int]] = {
+        'escape_encoded_alt_text': (over_bodies(
+            lambda page: html_assists.escape_encoded_alt_text(page.body)), len(pages)),
+        'escape_encoded_span_text': (over_bodies(
+            lambda page: html_assists.escape_encoded_span_text(page.body)), len(pages)),
+        'escape_encoded_pre_text': (over_bodies(
+            lambda page: html_assists.escape_encoded_pre_text(page.body)), len(pages)),
+        'rewrite_hub_links': (over_bodies(
+            lambda page: html_assists.rewrite_hub_links(
+                page.body, rewriter, page.page_filename)), len(pages)),
+        'postprocess_body': (over_bodies(
+            lambda page: html_assists.postprocess_body(
+                page.body, link_mappings=rewriter, page_filename=page.page_filename)),
+            len(pages)),
+        'convert_nav_html_to_json': (over_bodies(
+            lambda page: html_assists.convert_nav_html_to_json(page.toctree_html)),
+            len(pages)),
+        'convert_nav_nodes_to_json': (over_bodies(
+            lambda page: html_assists.convert_nav_nodes_to_json(
+                page.toctree_nodes, secnumber_suffix)), len(pages)),
+        'serialize_context': (over_bodies(
+            lambda page: builder.serialize_context(page.context)), len(pages)),
+    }
+    if hrefs:
+        def rewrite_hrefs() -> None:
+            for href, page_filename in hrefs:
+                rewriter.rewrite(href, page_filename)
+        benchmarks['LinkRewriter.rewrite'] = (rewrite_hrefs, len(hrefs))
+    return {name: measure(func, repeat, calls) for name, (func, calls) in benchmarks.items()}
+
+
+def build(srcdir: str, outdir: str, builder: str, parser: str) -> float:
+    """Build *srcdir* from scratch with *builder*, and return the build's
+    wall-clock time.
+    """
+    shutil.rmtree(outdir, ignore_errors=True)
+    start = time.perf_counter()
+    app = Sphinx(srcdir, srcdir, outdir, path.join(outdir, '.doctrees'), builder,
+                 confoverrides={'html_body_cache_size': 0, 'html_parser_backend': parser},
+                 status=None, warning=None, freshenv=True)
+    app.build(force_all=True)
+    return time.perf_counter() - start
+
+
+def build_benchmarks(srcdir: str, outdir: str, builders: list[str], parser: str,
+                     repeat: int) -> dict[str, dict[str, float]]:
+    results = {}
+    for name in builders:
+        times = [build(srcdir, outdir, name, parser) for _ in range(repeat)]
+        results[name] = {'min_s': min(times), 'median_s': statistics.median(times),
+                         'runs': repeat}
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=path.dirname(path.abspath(__file__)),
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    docset.add_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='how many times to run each micro-benchmark')
+    parser.add_argument('--build-repeat', type=int, default=1,
+                        help='how many times to run each build')
+    parser.add_argument('--builders', nargs='*', default=['json', 'pickle'],
+                        help='the builders to time end-to-end builds of')
+    parser.add_argument('--parser', default='html.parser',
+                        help='the html_parser_backend to benchmark with')
+    parser.add_argument('--output', '-o', help='the file to write the results to '
+                        '(by default, they are printed)')
+    args = parser.parse_args()
+    options = docset.options_from_arguments(args)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        srcdir = path.join(tmpdir, 'src')
+        outdir = path.join(tmpdir, 'out')
+        docset.generate(srcdir, options)
+        builder, pages = harvest(srcdir, outdir, args.parser)
+        micro = micro_benchmarks(builder, pages, args.repeat)
+        builds = build_benchmarks(srcdir, outdir, args.builders, args.parser,
+                                  args.build_repeat)
+
+    results = {
+        'metadata': {
+            'commit': git_commit(),
+            'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'sphinx': sphinx.__display_version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'parser': builder.parser_backend,
+            'docset': dataclasses.asdict(options),
+            'pages': len(pages),
+        },
+        'micro': micro,
+        'builds': builds,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,62 @@
 from __future__ import annotations
 
+import copy
+import glob
+import hashlib
+import json
 import os
 import pickle
+import posixpath
+import shutil
+import tracemalloc
 import types
+from functools import partial
+from inspect import signature
 from os import path
+from pathlib import Path
 from typing import TYPE_CHECKING
 
+from docutils import nodes
 from sphinx.application import ENV_PICKLE_FILENAME, Sphinx
 from sphinx.builders.html import BuildInfo, StandaloneHTMLBuilder
+from sphinx.environment.adapters import toctree as toctree_adapter
+from sphinx.errors import ConfigError
 from sphinx.locale import get_translation
-from sphinx.util.osutil import SEP, copyfile, ensuredir, os_path
+from sphinx.util import logging
+from sphinx.util.osutil import SEP, ensuredir, os_path
 from sphinx.writers.html5 import HTML5Translator
 
-from sphinxcontrib.serializinghtml import html_assists, jsonimpl
+from sphinxcontrib.serializinghtml import (
+    bodycache,
+    compression,
+    copying,
+    html_assists,
+    imagestore,
+    instrumentation,
+    jsonimpl,
+    ndjson,
+    pack,
+    pool,
+    writer,
+)
+from sphinxcontrib.serializinghtml.filenames import (
+    BODY_SUFFIX,
+    CHANGES_FILENAME,
+    ENV_EXPORT_FILENAME,
+    LAST_BUILD_FILENAME,
+    MANIFEST_FILENAME,
+    SEARCH_SHARDS_DIRNAME,
+    SHARED_DIRNAME,
+)
 
 if TYPE_CHECKING:
-    from collections.abc import Sequence
+    from collections.abc import Callable, Iterator, Sequence, Set
     from typing import Any, Protocol
 
+    from docutils.nodes import Node
+
+    from sphinxcontrib.serializinghtml.instrumentation import NullTimer, PageTimer
+
     class SerialisingImplementation(Protocol):
         def dump(self, obj: Any, file: Any, *args: Any, **kwargs: Any) -> None: ...
         def dumps(self, obj: Any, *args: Any, **kwargs: Any) -> str | bytes: ...
@@ -31,22 +70,172 @@ package_dir = path.abspath(path.dirname(__file__))
 
 __ = get_translation(__name__, 'console')
 
+logger = logging.getLogger(__name__)
+
+
+#: the page context values that are written once to SHARED_DIRNAME in
+#: compact context mode, rather than in each page
+SHARED_CONTEXT_KEYS = ('toctree', 'sidebars')
 
-#: the filename for the "last build" file (for serializing builders)
-LAST_BUILD_FILENAME = 'last_build'
+#: the stand-in for a large body while serializing the rest of its page,
+#: which the encoded pieces of the body then replace
+BODY_PLACEHOLDER = '\x00serializinghtml-body\x00'
+
+#: whether global_toctree_for_doc() exists and wants the builder's tags
+if hasattr(toctree_adapter, 'global_toctree_for_doc'):
+    _toctree_takes_tags = (
+        'tags' in signature(toctree_adapter.global_toctree_for_doc).parameters)
+else:
+    _toctree_takes_tags = False
 
 class CustomSerializingTranslator(HTML5Translator):
     """
     Custom translator to add 'document-content-section' class
     to all <section> tags.
+
+    If the builder has ``translator_rewrites`` set, the translator also
+    applies the html_assists body rewrites (image alt text, code text and
+    Hub links) as it writes the page body, so that the body doesn't need
+    to be parsed again afterwards. Markup the translator doesn't write
+    itself is post-processed on its own, unless its tags are only closed
+    by another fragment: raw HTML, parsed literal blocks, and the markup of
+    extension nodes written in one go (graphviz, imgmath etc.).
     """
+    def __init__(self, document: nodes.document, builder: SerializingHTMLBuilder) -> None:
+        super().__init__(document, builder)
+        # Fragments rendered on their own (titles etc.) aren't part of the
+        # page body, so they are left alone just like on the post-parse path.
+        self.rewrite_body = (getattr(builder, 'translator_rewrites', False)
+                             and not getattr(builder, 'rendering_partial', False))
+        if self.rewrite_body:
+            self.link_rewriter = builder.link_rewriter
+            self.page_filename = builder.get_page_filename(builder.current_docname)
+        self.parsed_literal_start: int | None = None
+
     def visit_section(self, node):
-        print("visit_section called")
         node.setdefault('classes', []).append('document-content-section')
         
         # Call the *original* parent method
         super().visit_section(node)
 
+    def emptytag(self, node: nodes.Element, tagname: str, suffix: str = '\n',
+                 **attributes: Any) -> str:
+        # visit_image() emits the <img> tag through here, with the alt text
+        # defaulting to the image URI.
+        if self.rewrite_body and tagname == 'img' and attributes.get('alt'):
+            attributes['alt'] = html_assists.escape_encoded_text(attributes['alt'])
+        return super().emptytag(node, tagname, suffix, **attributes)
+
+    def postprocess_fragment(self, start: int) -> None:
+        """Post-process the markup written to the body from *start* on its
+        own, as the post-parse path would. A fragment whose tags aren't
+        closed within it would be restructured by parsing it on its own, so
+        it is left alone.
+        """
+        fragment = ''.join(self.body[start:])
+        if html_assists.is_well_nested(fragment):
+            self.body[start:] = [html_assists.postprocess_body(
+                fragment, link_mappings=self.link_rewriter,
+                page_filename=self.page_filename)]
+
+    def visit_by_extension(self, visit: Callable[[Node], None], node: Node) -> None:
+        """Visit *node* with the extension visitor *visit*. The markup of
+        visitors that write their node in one go (graphviz, imgmath etc.)
+        doesn't go through the methods here, so it is post-processed.
+        """
+        start = len(self.body)
+        self.rewrite_body = False
+        try:
+            visit(node)
+        except nodes.SkipNode:
+            self.postprocess_fragment(start)
+            raise
+        finally:
+            self.rewrite_body = True
+
+    def dispatch_visit(self, node: Node) -> None:
+        # Extensions add the visitors for their nodes to the translator
+        # instance.
+        if self.rewrite_body and self.is_extension_node(node):
+            return self.visit_by_extension(super().dispatch_visit, node)
+        super().dispatch_visit(node)
+
+    def is_extension_node(self, node: Node) -> bool:
+        """Return whether *node* is visited by a visitor an extension added."""
+        for node_class in node.__class__.__mro__:
+            name = 'visit_' + node_class.__name__
+            if hasattr(self, name):
+                return name in vars(self)
+        return False
+
+    def visit_math(self, node: nodes.math, math_env: str = '') -> None:
+        # Math is written by the visitors of the math renderer extension.
+        if not self.rewrite_body:
+            return super().visit_math(node, math_env)
+        self.visit_by_extension(partial(super().visit_math, math_env=math_env), node)
+
+    def visit_math_block(self, node: nodes.math_block, math_env: str = '') -> None:
+        if not self.rewrite_body:
+            return super().visit_math_block(node, math_env)
+        self.visit_by_extension(partial(super().visit_math_block, math_env=math_env), node)
+
+    def visit_literal_block(self, node: nodes.literal_block) -> None:
+        if not self.rewrite_body:
+            return super().visit_literal_block(node)
+        start = len(self.body)
+        try:
+            super().visit_literal_block(node)
+        except nodes.SkipNode:
+            # Highlighted code is written in one go; escape the text of the
+            # token <span> tags in it.
+            highlighted = ''.join(self.body[start:])
+            self.body[start:] = [html_assists.escape_encoded_span_text(highlighted)]
+            raise
+        # A parsed literal block has markup in its <pre>, whose <span> tags
+        # are escaped however deeply they are nested; it is post-processed
+        # as a whole in depart_literal_block().
+        self.parsed_literal_start = start
+        self.rewrite_body = False
+
+    def depart_literal_block(self, node: nodes.literal_block) -> None:
+        super().depart_literal_block(node)
+        if self.parsed_literal_start is not None:
+            self.rewrite_body = True
+            self.postprocess_fragment(self.parsed_literal_start)
+            self.parsed_literal_start = None
+
+    def visit_Text(self, node: nodes.Text) -> None:
+        # visit_literal() sets protect_literal_text, which makes the text of
+        # an inline literal be written as <span class="pre"> tokens. Escaping
+        # is done character by character, so escaping the whole text gives
+        # the same result as escaping each token.
+        if self.rewrite_body and self.protect_literal_text:
+            text = node.astext()
+            escaped = html_assists.escape_encoded_text(text)
+            if escaped is not text:
+                node = nodes.Text(escaped)
+        super().visit_Text(node)
+
+    def starttag(self, node: nodes.Element, tagname: str, suffix: str = '\n',
+                 empty: bool = False, **attributes: Any) -> str:
+        # visit_reference() and visit_download_reference() emit their <a>
+        # tags through here.
+        if self.rewrite_body and tagname == 'a' and attributes.get('href'):
+            attributes['href'] = self.link_rewriter.rewrite(attributes['href'],
+                                                            self.page_filename)
+        return super().starttag(node, tagname, suffix, empty, **attributes)
+
+    def visit_raw(self, node: nodes.raw) -> None:
+        if not self.rewrite_body:
+            return super().visit_raw(node)
+        start = len(self.body)
+        try:
+            super().visit_raw(node)
+        except nodes.SkipNode:
+            # Raw HTML is written as it is.
+            self.postprocess_fragment(start)
+            raise
+
 class SerializingHTMLBuilder(StandaloneHTMLBuilder):
     """
     An abstract builder that serializes the generated HTML.
@@ -104,6 +293,263 @@ class SerializingHTMLBuilder(StandaloneHTMLBuilder):
         except AttributeError:
             pass
         self.link_mappings = link_mappings
+        # Compiled for longest-prefix lookups, and memoizing the rewritten
+        # links for the build.
+        self.link_rewriter = html_assists.LinkRewriter(link_mappings)
+        # Apply the html_assists body rewrites in the translator rather than
+        # by parsing the body again in handle_page.
+        self.translator_rewrites = self.get_builder_config('translator_rewrites', 'html')
+        parser = self.get_builder_config('parser_backend', 'html')
+        self.parser_backend = html_assists.use_parser(parser)
+        if parser not in ('auto', self.parser_backend):
+            logger.warning(__('HTML parser %r is not available; using %r instead'),
+                           parser, self.parser_backend)
+        self.rendering_partial = False
+        self.toctree_json_cache: dict[tuple[str, tuple[str, ...]], list[dict[str, Any]]] = {}
+        self.toctree_parents: dict[str, str] | None = None
+        # Per-page timings, reported through the serializinghtml-page-timings
+        # event and summarised in handle_finish.
+        self.instrumentation = self.get_builder_config('instrumentation', 'html')
+        self.instrumentation_report = self.get_builder_config('instrumentation_report', 'html')
+        # Also record the peak memory used to process each page.
+        self.instrumentation_memory = (
+            self.instrumentation and self.get_builder_config('instrumentation_memory', 'html'))
+        self.tracing_memory = self.instrumentation_memory and not tracemalloc.is_tracing()
+        if self.tracing_memory:
+            tracemalloc.start()
+        # Records kept for each page written, for handle_finish.
+        self.main_pid = os.getpid()
+        self.page_records: list[dict[str, Any]] = []
+        # The output file and content hash of each page, as of the last build,
+        # so that unchanged pages aren't written again.
+        self.manifest = self.load_manifest()
+        # Compressed copies of the output files, for serving directly.
+        self.precompress = list(self.get_builder_config('precompress', 'html'))
+        for fmt in self.precompress:
+            if fmt not in compression.FORMATS:
+                raise ConfigError(__('Unknown html_precompress format: %r') % fmt)
+        self.precompress_level = self.get_builder_config('precompress_level', 'html')
+        self.precompress_originals = self.get_builder_config('precompress_originals', 'html')
+        # Pack all the pages into a single file. The pages are written to a
+        # directory in the doctree directory first, so that a page which
+        # hasn't changed doesn't need to be written again.
+        self.pack = self.get_builder_config('pack', 'html')
+        self.page_root = os.fspath(self.outdir)
+        if self.pack:
+            self.page_root = path.join(self.doctreedir, 'serializinghtml-pack')
+            ensuredir(self.page_root)
+            if self.precompress:
+                logger.warning(__('html_precompress does not apply to packed output'))
+                self.precompress = []
+        # Also write the search index split into shards by term prefix.
+        self.search_shards = self.get_builder_config('search_shards', 'html')
+        self.search_shard_prefix_length = self.get_builder_config(
+            'search_shard_prefix_length', 'html')
+        # Write page bodies to files of their own, as UTF-8 encoded HTML.
+        self.split_body = self.get_builder_config('split_body', 'html')
+        # Leave the values that pages share out of the page files.
+        self.compact_context = self.get_builder_config('compact_context', 'html')
+        self.shared_globalcontext: dict[str, Any] = {}
+        # How to copy the environment pickle and sources, when they have
+        # changed. The pickle is never hard linked.
+        self.copy_method = self.get_builder_config('copy_method', 'html')
+        if self.copy_method not in copying.COPY_METHODS:
+            raise ConfigError(__('Unknown html_copy_method: %r') % self.copy_method)
+        self.copy_env = self.get_builder_config('copy_env', 'html')
+        # Name images by their content, keeping them in html_image_store
+        # (relative to the configuration directory) if it is set.
+        self.hashed_images = self.get_builder_config('hashed_images', 'html')
+        self.image_store = self.get_builder_config('image_store', 'html')
+        if self.image_store:
+            self.image_store = path.join(self.confdir, self.image_store)
+        self.image_hashes = imagestore.ImageHashes(
+            path.join(self.doctreedir, 'serializinghtml-images.json'))
+        self.env_export = self.get_builder_config('env_export', 'html')
+        # Write pages in background threads.
+        self.writer_threads = self.get_builder_config('writer_threads', 'html')
+        self.writer: writer.BackgroundWriter | None = None
+        # The output directories known to exist, so that they are only
+        # created once per build.
+        self.made_dirs: set[str] = set()
+        # Post-process and serialize pages in a pool of worker processes.
+        self.pool_size = self.get_builder_config('pool_size', 'html')
+        if self.pool_size and not pool.pool_available:
+            logger.warning(__('html_pool_size is set, but worker processes '
+                              'are not available on this platform'))
+            self.pool_size = 0
+        self.page_pool: pool.PagePool | None = None
+        # Bodies of at least this many characters are post-processed in
+        # pieces of about html_large_body_chunk_size characters, and serialized
+        # in pieces, to bound the memory used.
+        self.large_body_threshold = self.get_builder_config('large_body_threshold', 'html')
+        self.large_body_chunk_size = self.get_builder_config('large_body_chunk_size', 'html')
+        # Post-processed bodies are kept between builds, as long as the
+        # extension version, HTML parser and link mappings stay the same.
+        self.body_cache = None
+        body_cache_size = self.get_builder_config('body_cache_size', 'html')
+        if body_cache_size and not self.translator_rewrites:
+            self.body_cache = bodycache.BodyCache(
+                path.join(self.doctreedir, 'serializinghtml-bodies'),
+                f'{__version__}:{self.parser_backend}', link_mappings, body_cache_size)
+
+    def get_page_filename(self, pagename: str) -> str:
+        """Return the name a page is published under.
+
+        PJC: Index files are published under the name of their directory,
+        and the top-level index under the project name.
+        """
+        parts = pagename.split(SEP)
+        if parts[-1] == "index":
+            if len(parts) == 1:
+                # Use the project name
+                return self.get_builder_config('project_name', 'html')
+            return SEP.join(parts[:-1])
+        return pagename
+
+    def get_page_output(self, pagename: str) -> str:
+        """Return the file a page's serialized context is written to (or its
+        first compressed copy, if html_precompress_originals is off).
+
+        With html_pack, this is the page's file in the page root, which is
+        kept between builds.
+        """
+        filename = os_path(self.get_page_filename(pagename)) + self.out_suffix
+        return self.output_files(path.join(self.page_root, filename))[0][0]
+
+    # The pages aren't written where StandaloneHTMLBuilder would put them, so
+    # point get_outdated_docs() at the files that are actually written.
+    def get_output_path(self, page_name: str, /) -> Path:
+        return Path(self.get_page_output(page_name))
+
+    def get_outfilename(self, pagename: str) -> str:  # type: ignore[override]
+        # Sphinx < 8.1 checks this rather than get_output_path()
+        return self.get_page_output(pagename)
+
+    def post_process_images(self, doctree: Node) -> None:
+        super().post_process_images(doctree)
+        if not self.hashed_images:
+            return
+        for node in doctree.findall(nodes.image):
+            uri = node['uri']
+            if uri not in self.images:
+                continue
+            old_refuri = posixpath.join(self.imgpath, self.images[uri])
+            self.images[uri] = self.get_hashed_image_name(uri)
+            # down-scaled images link to the full size image
+            parent = node.parent
+            if isinstance(parent, nodes.reference) and parent.get('refuri') == old_refuri:
+                parent['refuri'] = posixpath.join(self.imgpath, self.images[uri])
+
+    def get_hashed_image_name(self, uri: str) -> str:
+        """Return the content-addressed name of the image *uri*, or the name
+        the HTML builder gives it if the image can't be read.
+        """
+        try:
+            digest = self.image_hashes.digest(path.join(self.srcdir, uri))
+        except OSError:
+            # left to copy_image_files() to warn about
+            return self.env.images[uri][1]
+        return imagestore.hashed_name(uri, digest)
+
+    def copy_image_files(self) -> None:
+        if not self.hashed_images:
+            super().copy_image_files()
+            return
+        imagedir = path.join(self.outdir, self.imagedir)
+        if self.images:
+            ensuredir(imagedir)
+        for src, dest in self.images.items():
+            source = path.join(self.srcdir, src)
+            try:
+                imagestore.copy_image(source, path.join(imagedir, dest), self.image_store,
+                                      self.copy_method)
+            except Exception as err:
+                logger.warning(__("cannot copy image file '%s': %s"), source, err)
+        self.image_hashes.save()
+
+    def prepare_writing(self, docnames: Set[str]) -> None:
+        super().prepare_writing(docnames)
+        self.page_records = []
+        for journal in glob.glob(path.join(self.doctreedir, 'serializinghtml-*.journal')):
+            os.unlink(journal)
+        # The toctree structure is only final once reading has finished.
+        self.toctree_json_cache = {}
+        self.toctree_parents = None
+        self.shared_globalcontext = self.serializable_context(self.globalcontext)
+        self.made_dirs = set()
+        # Fork the worker processes before any writer thread is started:
+        # forking a process with other threads running can deadlock.
+        if self.pool_size and self.page_pool is None:
+            self.page_pool = pool.PagePool(self, self.pool_size)
+
+    def get_local_toctree_nodes(self, docname: str, collapse: bool = True,
+                                **kwargs: Any) -> nodes.Element | None:
+        """Return the resolved toctree that _get_local_toctree() renders."""
+        if 'includehidden' not in kwargs:
+            kwargs['includehidden'] = False
+        if kwargs.get('maxdepth') == '':
+            kwargs.pop('maxdepth')
+        if not hasattr(toctree_adapter, 'global_toctree_for_doc'):
+            # Sphinx < 7.2
+            return toctree_adapter.TocTree(self.env).get_toctree_for(
+                docname, self, collapse, **kwargs)
+        if _toctree_takes_tags:
+            kwargs['tags'] = self.tags
+        return toctree_adapter.global_toctree_for_doc(
+            self.env, docname, self, collapse=collapse, **kwargs)
+
+    def get_toctree_cache_key(self, pagename: str) -> tuple[str, tuple[str, ...]] | None:
+        """Return the key under which the toctree JSON of *pagename* is shared.
+
+        With the toctree collapsed, the JSON only shows the top two levels of
+        the navigation, expanding the top-level entry the page is under. The
+        links in it are relative to the page's directory. So pages that are
+        at least three levels down, in the same directory and under the same
+        chain of parent documents get the same JSON. Pages that are included
+        in more than one place are never shared.
+        """
+        if self.toctree_parents is None:
+            includers: dict[str, set[str]] = {}
+            for parent, children in self.env.toctree_includes.items():
+                for child in children:
+                    includers.setdefault(child, set()).add(parent)
+            self.toctree_parents = {child: parents.pop()
+                                    for child, parents in includers.items()
+                                    if len(parents) == 1}
+
+        chain: list[str] = []
+        docname = pagename
+        while docname in self.toctree_parents and docname not in chain:
+            chain.append(docname)
+            docname = self.toctree_parents[docname]
+        if len(chain) < 3 or docname in chain or docname != self.config.root_doc:
+            return None
+        page_dir = self.get_target_uri(pagename).rpartition(SEP)[0]
+        return page_dir, tuple(chain[1:])
+
+    def get_toctree_json(self, pagename: str) -> list[dict[str, Any]]:
+        """Return the navigation for *pagename* as section/link dictionaries.
+
+        This works on the resolved toctree nodes rather than parsing the
+        rendered toctree, and reuses the result between pages that share it
+        (see get_toctree_cache_key()).
+        """
+        key = self.get_toctree_cache_key(pagename)
+        if key is not None and key in self.toctree_json_cache:
+            return copy.deepcopy(self.toctree_json_cache[key])
+        toctree = self.get_local_toctree_nodes(pagename, includehidden=True)
+        result = html_assists.convert_nav_nodes_to_json(
+            toctree, self.config.html_secnumber_suffix)
+        if key is not None:
+            self.toctree_json_cache[key] = copy.deepcopy(result)
+        return result
+
+    def render_partial(self, node: nodes.Node | None) -> dict[str, str]:
+        self.rendering_partial = True
+        try:
+            return super().render_partial(node)
+        finally:
+            self.rendering_partial = False
 
     def get_target_uri(self, docname: str, typ: str | None = None) -> str:
         if docname == 'index':
@@ -112,90 +558,620 @@ class SerializingHTMLBuilder(StandaloneHTMLBuilder):
             return docname[:-5]  # up to sep
         return docname
 
-    def dump_context(self, context: dict[str, Any], filename: str | os.PathLike[str]) -> None:
+    def serializable_context(self, context: dict[str, Any]) -> dict[str, Any]:
+        """Return a copy of *context* with the CSS and script files replaced
+        by their filenames.
+        """
         context = context.copy()
         if 'css_files' in context:
             context['css_files'] = [css.filename for css in context['css_files']]
         if 'script_files' in context:
             context['script_files'] = [js.filename for js in context['script_files']]
+        return context
+
+    def serialize_context(self, context: dict[str, Any]) -> bytes:
+        """Return *context* serialized with the builder's implementation."""
+        return self.encode_context(self.serializable_context(context))
+
+    def encode_context(self, context: dict[str, Any]) -> bytes:
+        data = self.implementation.dumps(context, *self.additional_dump_args)
+        if self.implementation_dumps_unicode:
+            return data.encode('utf-8')  # type: ignore[union-attr]
+        return data  # type: ignore[return-value]
+
+    def write_output(self, filename: str | os.PathLike[str], data: bytes) -> None:
+        """Write *data* to *filename*, atomically replacing any existing file
+        so that readers never see a partly written file.
+        """
+        with compression.open_output(os.fspath(filename)) as fb:
+            fb.write(data)
+
+    def output_files(self, filename: str) -> list[tuple[str, str]]:
+        """Return the files to write for the output file *filename*, with
+        their compression formats.
+        """
+        files = [(f'{filename}.{fmt}', fmt) for fmt in self.precompress]
+        if self.precompress_originals or not files:
+            files.insert(0, (filename, ''))
+        return files
+
+    def encode_context_with_body(self, context: dict[str, Any],
+                                 pieces: list[str]) -> bytes | list[bytes]:
+        """Serialize *context* with a body made of *pieces*.
+
+        For text formats, the body is encoded a piece at a time and the
+        result is the list of the encoded pieces, so that the whole body is
+        never encoded at once.
+        """
+        parts = []
         if self.implementation_dumps_unicode:
-            with open(filename, 'w', encoding='utf-8') as ft:
-                self.implementation.dump(context, ft, *self.additional_dump_args)
+            context['body'] = BODY_PLACEHOLDER
+            placeholder = self.encode_string_content(BODY_PLACEHOLDER)
+            parts = self.encode_context(context).split(placeholder)
+        if len(parts) != 2:
+            context['body'] = ''.join(pieces)
+            return self.encode_context(context)
+        prefix, suffix = parts
+        return [prefix, *map(self.encode_string_content, pieces), suffix]
+
+    def encode_string_content(self, text: str) -> bytes:
+        """Return the string *text* encoded as it is in a serialized
+        context, without its quotes. Only text formats have these.
+        """
+        data = self.implementation.dumps(text, *self.additional_dump_args)
+        return data.encode('utf-8')[1:-1]  # type: ignore[union-attr]
+
+    def write_output_files(self, filename: str, data: bytes | list[bytes]) -> None:
+        """Write *data* (or the list of its pieces) to *filename*, and to its
+        compressed copies.
+        """
+        files = self.output_files(filename)
+        for target, fmt in files:
+            with compression.open_output(target, fmt, self.precompress_level) as f:
+                if isinstance(data, bytes):
+                    f.write(data)
+                else:
+                    f.writelines(data)
+        # Remove any copies written with other settings, which would be stale.
+        written = {target for target, _ in files}
+        for target in [filename, *(f'{filename}.{fmt}' for fmt in compression.FORMATS)]:
+            if target not in written and path.exists(target):
+                os.unlink(target)
+
+    def write_page(self, pagename: str, filename: str, data: bytes | list[bytes],
+                   shared: Sequence[str] = (),
+                   body: bytes | list[bytes] | None = None) -> dict[str, Any]:
+        """Write a page's serialized context to *filename*, and its *body*
+        if it is written separately, unless the files already hold the same
+        content according to the manifest. Either may be a list of pieces.
+
+        Return the page's manifest entry, which lists the *shared* values
+        the page refers to in compact context mode.
+        """
+        digest = hashlib.sha256()
+        for content in (data, body):
+            if isinstance(content, bytes):
+                digest.update(content)
+            elif content is not None:
+                for piece in content:
+                    digest.update(piece)
+        body_filename = path.splitext(filename)[0] + BODY_SUFFIX
+        entry: dict[str, Any] = {
+            'file': path.relpath(filename, self.page_root).replace(os.sep, SEP),
+            'hash': digest.hexdigest(),
+        }
+        files = self.output_files(filename)
+        if body is not None:
+            entry['body'] = path.relpath(body_filename, self.page_root).replace(os.sep, SEP)
+            files += self.output_files(body_filename)
+        if shared:
+            entry['shared'] = list(shared)
+        if self.manifest.get(pagename) != entry or not all(
+                path.isfile(target) for target, _ in files):
+            self.ensure_dir(path.dirname(filename))
+            # the body may have been written separately by an earlier build
+            remove_body = body is None and 'body' in self.manifest.get(pagename, {})
+            self.run_write(self.write_page_files, filename, data, body_filename, body,
+                           remove_body)
+        else:
+            # Mark the files as up to date with the source, or the page would
+            # be seen as outdated (and rebuilt) again by the next build.
+            for target, _ in files:
+                os.utime(target)
+        return entry
+
+    def write_page_files(self, filename: str, data: bytes | list[bytes], body_filename: str,
+                         body: bytes | list[bytes] | None, remove_body: bool) -> None:
+        self.write_output_files(filename, data)
+        if body is not None:
+            self.write_output_files(body_filename, body)
+        elif remove_body:
+            for target, _ in self.output_files(body_filename):
+                if path.exists(target):
+                    os.unlink(target)
+
+    def ensure_dir(self, dirname: str) -> None:
+        """Make sure the output directory *dirname* exists."""
+        if dirname not in self.made_dirs:
+            ensuredir(dirname)
+            self.made_dirs.add(dirname)
+
+    def run_write(self, func: Callable[..., Any], *args: Any) -> None:
+        """Call ``func(*args)``, in a background writer thread if
+        html_writer_threads is set.
+
+        The directories written to must exist already.
+        """
+        if not self.writer_threads or os.getpid() != self.main_pid:
+            # Forked processes (for parallel writing) don't have the threads.
+            func(*args)
+            return
+        if self.writer is None:
+            self.writer = writer.BackgroundWriter(self.writer_threads,
+                                                  self.writer_threads * 8)
+        self.writer.submit(func, *args)
+
+    def load_manifest(self) -> dict[str, dict[str, str]]:
+        try:
+            with open(path.join(self.outdir, MANIFEST_FILENAME), encoding='utf-8') as f:
+                return json.load(f)['pages']
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def update_manifest(self, records: list[dict[str, Any]]) -> dict[str, list[str]]:
+        """Write the manifest of the pages now in the output directory, and the
+        pages added, modified and removed by this build.
+
+        Pages that weren't written by this build are kept in the manifest
+        as long as their document still exists.
+        """
+        written = {record['page']: record['output'] for record in records}
+        manifest = {pagename: entry for pagename, entry in self.manifest.items()
+                    if pagename in self.env.all_docs and pagename not in written}
+        manifest.update(written)
+        changes: dict[str, list[str]] = {'added': [], 'modified': [], 'removed': []}
+        for pagename, entry in written.items():
+            if pagename not in self.manifest:
+                changes['added'].append(entry['file'])
+            elif entry != self.manifest[pagename]:
+                changes['modified'].append(entry['file'])
+        kept = {entry[key] for entry in manifest.values()
+                for key in ('file', 'body') if key in entry}
+        for pagename, entry in self.manifest.items():
+            if pagename not in manifest:
+                changes['removed'].append(entry['file'])
+                self.remove_page_files(entry, kept)
+        for files in changes.values():
+            files.sort()
+
+        self.write_output(path.join(self.outdir, MANIFEST_FILENAME),
+                          json.dumps({'pages': dict(sorted(manifest.items()))},
+                                     indent=1).encode('utf-8'))
+        self.write_output(path.join(self.outdir, CHANGES_FILENAME),
+                          json.dumps(changes, indent=1).encode('utf-8'))
+        self.manifest = manifest
+        return changes
+
+    def remove_page_files(self, entry: dict[str, Any], kept: Set[str]) -> None:
+        """Remove the files of a page's manifest *entry*, and their compressed
+        copies, other than those in *kept*.
+        """
+        for key in ('file', 'body'):
+            if key not in entry or entry[key] in kept:
+                continue
+            filename = path.join(self.page_root, os_path(entry[key]))
+            for target in [filename, *(f'{filename}.{fmt}' for fmt in compression.FORMATS)]:
+                if path.exists(target):
+                    os.unlink(target)
+
+    def write_pack(self) -> None:
+        """Pack the pages, the global context and the search index into
+        the output directory.
+
+        The pages removed by this build have already been removed from the
+        page root by :meth:`update_manifest`.
+        """
+        files = [(entry[key], path.join(self.page_root, os_path(entry[key])))
+                 for entry in self.manifest.values()
+                 for key in ('file', 'body') if key in entry]
+        files.append((self.globalcontext_filename,
+                      path.join(self.page_root, self.globalcontext_filename)))
+        searchindex = path.join(self.outdir, self.searchindex_filename)
+        if self.indexer is not None and path.isfile(searchindex):
+            files.append((self.searchindex_filename, searchindex))
+        shard_root = path.join(self.page_root, SEARCH_SHARDS_DIRNAME)
+        if self.search_shards and path.isdir(shard_root):
+            files.extend((f'{SEARCH_SHARDS_DIRNAME}/{filename}',
+                          path.join(shard_root, filename))
+                         for filename in os.listdir(shard_root))
+        shared_dir = path.join(self.page_root, SHARED_DIRNAME)
+        if self.compact_context and path.isdir(shared_dir):
+            files.extend((f'{SHARED_DIRNAME}/{filename}', path.join(shared_dir, filename))
+                         for filename in os.listdir(shared_dir))
+        fmt = pack.FORMAT_JSON if self.implementation_dumps_unicode else pack.FORMAT_PICKLE
+        pack.write_pack(path.join(self.outdir, pack.PACK_DATA_FILENAME),
+                        path.join(self.outdir, pack.PACK_INDEX_FILENAME), files, fmt)
+
+    def dump_context(self, context: dict[str, Any], filename: str | os.PathLike[str]) -> None:
+        self.write_output_files(os.fspath(filename), self.serialize_context(context))
+
+    def dump_search_index(self) -> None:
+        super().dump_search_index()
+        if self.indexer is None:
+            return
+        # The original is always kept, as it is loaded again by the next
+        # incremental build.
+        filename = path.join(self.outdir, self.searchindex_filename)
+        for fmt in self.precompress:
+            compression.compress_file(filename, fmt, self.precompress_level)
+        if self.search_shards:
+            self.write_search_shards()
         else:
-            with open(filename, 'wb') as fb:
-                self.implementation.dump(context, fb, *self.additional_dump_args)
+            shutil.rmtree(path.join(self.page_root, SEARCH_SHARDS_DIRNAME), ignore_errors=True)
+
+    def encode_search_data(self, data: dict[str, Any]) -> bytes:
+        encoded = self.indexer_format.dumps(data)
+        if self.indexer_dumps_unicode:
+            return encoded.encode('utf-8')
+        return encoded
+
+    def write_search_shards(self) -> None:
+        """Write the search index as a manifest and shards of the terms.
+
+        The terms and title terms are split into shards by their first
+        html_search_shard_prefix_length characters; everything else (the
+        documents, titles, objects and so on) goes in the manifest, along
+        with the filename of the shard for each prefix.
+        """
+        assert self.indexer is not None
+        frozen = self.indexer.freeze()
+        length = self.search_shard_prefix_length
+        shards: dict[str, dict[str, dict[str, Any]]] = {}
+        for key in ('terms', 'titleterms'):
+            for term, value in frozen.pop(key).items():
+                shard = shards.setdefault(term[:length], {'terms': {}, 'titleterms': {}})
+                shard[key][term] = value
+
+        shard_root = path.join(self.page_root, SEARCH_SHARDS_DIRNAME)
+        shutil.rmtree(shard_root, ignore_errors=True)
+        ensuredir(shard_root)
+        suffix = path.splitext(self.searchindex_filename)[1]
+        frozen['shard_prefix_length'] = length
+        frozen['shards'] = {}
+        for prefix, shard in sorted(shards.items()):
+            # The prefix is encoded so that any characters are safe in
+            # a filename.
+            filename = prefix.encode('utf-8').hex() + suffix
+            frozen['shards'][prefix] = filename
+            self.write_output_files(path.join(shard_root, filename),
+                                    self.encode_search_data(shard))
+        self.write_output_files(path.join(shard_root, 'manifest' + suffix),
+                                self.encode_search_data(frozen))
+
+    def record_page(self, record: dict[str, Any]) -> None:
+        """Keep a JSON serializable record about a page for handle_finish.
+
+        When writing in parallel, pages are written in forked processes, so
+        their records are appended to a journal file in the doctree
+        directory, which handle_finish collects.
+        """
+        if os.getpid() == self.main_pid:
+            self.page_records.append(record)
+            return
+        journal = path.join(self.doctreedir, f'serializinghtml-{os.getpid()}.journal')
+        with open(journal, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def collect_page_records(self) -> list[dict[str, Any]]:
+        """Return the records of all pages written, including those written
+        by parallel processes.
+
+        The serializinghtml-page-timings event is emitted here for the pages
+        written by parallel processes, so that it reaches the listeners in
+        this process.
+        """
+        for journal in sorted(glob.glob(path.join(self.doctreedir,
+                                                  'serializinghtml-*.journal'))):
+            with open(journal, encoding='utf-8') as f:
+                records = [json.loads(line) for line in f]
+            os.unlink(journal)
+            for record in records:
+                if 'timings' in record:
+                    self.events.emit('serializinghtml-page-timings', record['page'],
+                                     record['timings'])
+            self.page_records.extend(records)
+        return self.page_records
+
+    def postprocess_body(self, body: str, page_filename: str,
+                         timer: PageTimer | NullTimer) -> str:
+        """Return *body* with the html_assists rewrites applied, from the body
+        cache if possible.
+        """
+        if self.body_cache is None:
+            return html_assists.postprocess_body(
+                body, timer=timer, link_mappings=self.link_rewriter,
+                page_filename=page_filename)
+        with timer.stage('body:cache'):
+            key = self.body_cache.key(body, page_filename)
+            cached = self.body_cache.get(key)
+        if cached is not None:
+            return cached
+        body = html_assists.postprocess_body(
+            body, timer=timer, link_mappings=self.link_rewriter,
+            page_filename=page_filename)
+        with timer.stage('body:cache'):
+            self.body_cache.set(key, body)
+        return body
+
+    def postprocess_large_body(self, body: str, page_filename: str,
+                               timer: PageTimer | NullTimer) -> list[str] | None:
+        """Return the pieces of *body* with the html_assists rewrites applied,
+        or None if they don't change it, processing a piece at a time.
+
+        Large bodies aren't kept in the body cache.
+        """
+        return html_assists.postprocess_body_chunks(
+            body, self.large_body_chunk_size, timer=timer, link_mappings=self.link_rewriter,
+            page_filename=page_filename)
 
     def handle_page(self, pagename: str, ctx: dict[str, Any], templatename: str = 'page.html',
                     outfilename: str | None = None, event_arg: Any = None) -> None:
+        timer: PageTimer | NullTimer = instrumentation.NULL_TIMER
+        if self.instrumentation:
+            timer = instrumentation.PageTimer(pagename)
+
         ctx['current_page_name'] = pagename
         ctx.setdefault('pathto', lambda p: p)
-        self.add_sidebars(pagename, ctx)
+        with timer.stage('sidebars'):
+            self.add_sidebars(pagename, ctx)
 
         # Add the toc tree as a JSON dictionary
-        ctx['toctree'] = html_assists.convert_nav_html_to_json(self._get_local_toctree(pagename, includehidden=True))
+        with timer.stage('toctree'):
+            ctx['toctree'] = self.get_toctree_json(pagename)
 
+        # PJC: Ensure that index files are actually written under the name of the
+        #      directory leafname.
+        page_filename = self.get_page_filename(pagename)
         if not outfilename:
-            # PJC: Ensure that index files are actually written under the name of the
-            #      directory leafname.
-            parts = pagename.split(SEP)
-            if parts[len(parts)-1] == "index":
-                if len(parts) == 1:
-                    # Use the project name
-                    page_filename = self.get_builder_config('project_name', 'html')
-                else:
-                    page_filename = SEP.join(parts[:-1])
-                ctx['current_page_name'] = page_filename
-            else:
-                page_filename = pagename
-            outfilename = path.join(self.outdir,
+            ctx['current_page_name'] = page_filename
+            outfilename = path.join(self.page_root,
                                     os_path(page_filename) + self.out_suffix)
+        elif self.pack:
+            outfilename = path.join(self.page_root, path.relpath(outfilename, self.outdir))
 
         # we're not taking the return value here, since no template is
         # actually rendered
-        self.app.emit('html-page-context', pagename, templatename, ctx, event_arg)
+        with timer.stage('page-context'):
+            self.app.emit('html-page-context', pagename, templatename, ctx, event_arg)
 
         # make context object serializable
         for key in list(ctx):
             if isinstance(ctx[key], types.FunctionType):
                 del ctx[key]
 
-        if "body" in ctx:
+        ctx = self.serializable_context(ctx)
+        sourcename = ctx.get('sourcename')
+        shared: list[str] = []
+        if self.compact_context:
+            with timer.stage('compact'):
+                ctx, shared = self.compact_page_context(ctx)
+        if self.split_body and 'body' in ctx:
+            body_filename = path.splitext(outfilename)[0] + BODY_SUFFIX
+            ctx['body_file'] = path.relpath(body_filename, self.page_root).replace(os.sep, SEP)
+        finish = partial(self.finish_page, pagename, outfilename, sourcename, shared, timer)
+        if os.getpid() == self.main_pid and self.page_pool is not None:
+            self.page_pool.submit(ctx, page_filename, timer.enabled, finish)
+        else:
+            finish((*self.process_page_context(ctx, page_filename, timer), {}, {}))
+
+    def process_page_context(
+        self, ctx: dict[str, Any], page_filename: str, timer: PageTimer | NullTimer,
+    ) -> tuple[bytes | list[bytes], bytes | list[bytes] | None]:
+        """Post-process the body of the serializable page context *ctx*, and
+        return the serialized context, and the UTF-8 encoded body if it is
+        written separately (when *ctx* has a ``body_file``).
+
+        Bodies over html_large_body_threshold are post-processed a piece at a
+        time, and the context and body are then returned as lists of pieces.
+
+        This is run by the worker processes when html_pool_size is set.
+        """
+        if self.instrumentation_memory and timer.enabled:
+            start_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        pieces = None
+        if "body" in ctx and not self.translator_rewrites:
             # PJC: Some Linaro documentation has encoded attributes in image ALT text
             # which then gets decoded when the HTML is loaded into the DOM, so
             # we need to alter it by "escaping" the ampersands with &amp; to
             # prevent the decoding.
-            ctx['body'] = html_assists.escape_encoded_alt_text(ctx['body'])
             # PJC: Furthermore, if there is any formatted code with encoded attributes,
             # e.g. < changed to &lt; then that also needs to be escaped because it is
             # also getting decoded.
-            ctx['body'] = html_assists.escape_encoded_pre_text(ctx['body'])
             # PJC: Go through the body, looking for any <a> tags to see if they
             # need to be re-mapped to a local Hub path.
-            ctx['body'] = html_assists.rewrite_hub_links(ctx['body'], self.link_mappings, page_filename)
+            # All of these run over a single parse of the body.
+            if self.large_body_threshold and len(ctx['body']) >= self.large_body_threshold:
+                pieces = self.postprocess_large_body(ctx['body'], page_filename, timer)
+            else:
+                ctx['body'] = self.postprocess_body(ctx['body'], page_filename, timer)
+        if timer.enabled and "body" in ctx:
+            timer.size('body', len(ctx['body']) if pieces is None
+                       else sum(len(piece) for piece in pieces))
+
+        body: bytes | list[bytes] | None = None
+        data: bytes | list[bytes]
+        with timer.stage('serialize'):
+            if 'body_file' in ctx:
+                text = ctx.pop('body')
+                body = (text.encode('utf-8') if pieces is None
+                        else [piece.encode('utf-8') for piece in pieces])
+                data = self.encode_context(ctx)
+            elif pieces is not None:
+                data = self.encode_context_with_body(ctx, pieces)
+            else:
+                data = self.encode_context(ctx)
+        if timer.enabled:
+            timer.size('output', sum(len(content) if isinstance(content, bytes)
+                                     else sum(map(len, content))
+                                     for content in (data, body) if content is not None))
+        if self.instrumentation_memory and timer.enabled:
+            timer.size('peak_memory', tracemalloc.get_traced_memory()[1] - start_memory)
+        return data, body
+
+    def compact_page_context(self, ctx: dict[str, Any]) -> tuple[dict[str, Any], list[str]]:
+        """Return the serializable page context *ctx* without the values
+        that it shares with the global context or with other pages, and the
+        IDs of the shared values it refers to.
+
+        Values equal to the global context's are left out, and their keys
+        listed in ``global_context``. The SHARED_CONTEXT_KEYS values are
+        written to SHARED_DIRNAME under an ID derived from their content,
+        which ``shared_context`` maps the keys to.
+        """
+        compact = {}
+        from_global = []
+        for key, value in ctx.items():
+            if key in self.shared_globalcontext and self.shared_globalcontext[key] == value:
+                from_global.append(key)
+            else:
+                compact[key] = value
+        shared = {}
+        for key in SHARED_CONTEXT_KEYS:
+            if key in compact:
+                data = self.encode_context(compact.pop(key))
+                shared[key] = self.write_shared(data)
+        compact['shared_context'] = shared
+        if from_global:
+            compact['global_context'] = from_global
+        return compact, sorted(set(shared.values()))
 
-        ensuredir(path.dirname(outfilename))
-        self.dump_context(ctx, outfilename)
+    def write_shared(self, data: bytes) -> str:
+        """Write a serialized value that pages share, if it hasn't already
+        been written, and return its ID.
+        """
+        shared_id = hashlib.sha256(data).hexdigest()[:20]
+        filename = path.join(self.page_root, SHARED_DIRNAME, shared_id + self.out_suffix)
+        if not all(path.isfile(target) for target, _ in self.output_files(filename)):
+            self.ensure_dir(path.dirname(filename))
+            self.write_output_files(filename, data)
+        return shared_id
+
+    def remove_unused_shared(self) -> None:
+        """Remove the shared values that no page refers to any more."""
+        shared_dir = path.join(self.page_root, SHARED_DIRNAME)
+        if not self.compact_context:
+            shutil.rmtree(shared_dir, ignore_errors=True)
+            return
+        used = {shared_id for entry in self.manifest.values()
+                for shared_id in entry.get('shared', ())}
+        for filename in os.listdir(shared_dir) if path.isdir(shared_dir) else ():
+            if filename.split('.', 1)[0] not in used:
+                os.unlink(path.join(shared_dir, filename))
+
+    def finish_page(self, pagename: str, outfilename: str, sourcename: str | None,
+                    shared: list[str], timer: PageTimer | NullTimer,
+                    result: pool.PageResult) -> None:
+        """Write a serialized page, and copy its source file."""
+        data, body, timings, sizes = result
+        if timer.enabled:
+            timer.timings.update(timings)  # type: ignore[union-attr]
+            timer.sizes.update(sizes)  # type: ignore[union-attr]
+        with timer.stage('write'):
+            record: dict[str, Any] = {
+                'page': pagename,
+                'output': self.write_page(pagename, outfilename, data, shared, body),
+            }
 
         # if there is a source file, copy the source file for the
         # "show source" link
-        if ctx.get('sourcename'):
-            source_name = path.join(self.outdir, '_sources',
-                                    os_path(ctx['sourcename']))
-            ensuredir(path.dirname(source_name))
-            copyfile(self.env.doc2path(pagename), source_name)
+        if sourcename:
+            with timer.stage('copy-source'):
+                source_name = path.join(self.outdir, '_sources', os_path(sourcename))
+                self.ensure_dir(path.dirname(source_name))
+                self.run_write(copying.copy_if_changed, self.env.doc2path(pagename),
+                               source_name, self.copy_method)
+
+        if timer.enabled:
+            record['timings'] = timer.record()  # type: ignore[union-attr]
+            # pages written by parallel processes are reported by
+            # collect_page_records()
+            if os.getpid() == self.main_pid:
+                self.events.emit('serializinghtml-page-timings', pagename, record['timings'])
+        self.record_page(record)
+
+    def write_instrumentation_report(self, records: list[dict[str, Any]]) -> None:
+        records = [record['timings'] for record in records if 'timings' in record]
+        report = instrumentation.summarize(records)
+        with open(path.join(self.outdir, self.instrumentation_report), 'w',
+                  encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    def export_env(self) -> None:
+        """Write the attributes of the environment listed in html_env_export,
+        as a pickled dictionary, for consumers that don't need all of it.
+        """
+        exported = {}
+        for name in self.env_export:
+            if hasattr(self.env, name):
+                exported[name] = getattr(self.env, name)
+            else:
+                logger.warning(__('html_env_export: the environment has no attribute %r'),
+                               name)
+        data = pickle.dumps(exported, pickle.HIGHEST_PROTOCOL)
+        filename = Path(self.outdir, ENV_EXPORT_FILENAME)
+        try:
+            if filename.read_bytes() == data:
+                return
+        except OSError:
+            pass
+        self.write_output(filename, data)
+
+    def finish_pages(self) -> None:
+        """Wait for all the pages to be written."""
+        # write the pages still being processed
+        if self.page_pool is not None:
+            self.page_pool.shutdown()
+            self.page_pool = None
+        # and wait for them to be written, before anything reads them or
+        # last_build says they are there
+        if self.writer is not None:
+            self.writer.shutdown()
+            self.writer = None
 
     def handle_finish(self) -> None:
+        self.finish_pages()
+
         # dump the global context
-        outfilename = path.join(self.outdir, self.globalcontext_filename)
+        outfilename = path.join(self.page_root, self.globalcontext_filename)
         self.dump_context(self.globalcontext, outfilename)
 
         # super here to dump the search index
         super().handle_finish()
 
+        records = self.collect_page_records()
+        self.update_manifest(records)
+        self.remove_unused_shared()
+        if self.pack:
+            self.write_pack()
+        if self.instrumentation and self.instrumentation_report:
+            self.write_instrumentation_report(records)
+        if self.tracing_memory:
+            tracemalloc.stop()
+            self.tracing_memory = False
+        if self.body_cache is not None:
+            self.body_cache.evict()
+
         # copy the environment file from the doctree dir to the output dir
-        # as needed by the web app
-        copyfile(path.join(self.doctreedir, ENV_PICKLE_FILENAME),
-                 path.join(self.outdir, ENV_PICKLE_FILENAME))
+        # as needed by the web app. Sphinx rewrites the pickle in place, so
+        # a hard link would let the web app read it half written.
+        if self.copy_env:
+            env_copy_method = 'reflink' if self.copy_method == 'hardlink' else self.copy_method
+            copying.copy_if_changed(path.join(self.doctreedir, ENV_PICKLE_FILENAME),
+                                    path.join(self.outdir, ENV_PICKLE_FILENAME),
+                                    env_copy_method)
+        if self.env_export:
+            self.export_env()
 
         # touch 'last build' file, used by the web application to determine
         # when to reload its environment and clear the cache
@@ -234,12 +1210,113 @@ class JSONHTMLBuilder(SerializingHTMLBuilder):
     globalcontext_filename = 'globalcontext.json'
     searchindex_filename = 'searchindex.json'
 
+    def init(self) -> None:
+        super().init()
+        backend = self.get_builder_config('json_backend', 'html')
+        self.json_backend = jsonimpl.use_backend(backend)
+        if backend not in ('auto', self.json_backend):
+            logger.warning(__('JSON backend %r is not available; using %r instead'),
+                           backend, self.json_backend)
+
+
+class NDJSONHTMLBuilder(JSONHTMLBuilder):
+    """
+    A builder that streams the pages' JSON into newline-delimited JSON files,
+    one line per page, for loading in bulk.
+
+    The global context and search index are written as by the JSON builder.
+    """
+    name = 'ndjson'
+    epilog = __('You can now process the NDJSON files in %(outdir)s.')
+
+    # Pages are written to the stream in order, by this process; the worker
+    # pool (html_pool_size) can still serialize them in parallel.
+    allow_parallel = False
+    #: the name of the stream files, before the part number and suffix
+    stream_basename = 'pages'
+
+    def init(self) -> None:
+        super().init()
+        if self.pack or self.split_body or self.compact_context:
+            logger.warning(__('html_pack, html_split_body and html_compact_context '
+                              'do not apply to the ndjson builder'))
+            self.pack = self.split_body = self.compact_context = False
+            self.page_root = os.fspath(self.outdir)
+        self.stream_compression = self.get_builder_config('ndjson_compression', 'html')
+        if self.stream_compression and self.stream_compression not in compression.FORMATS:
+            raise ConfigError(__('Unknown html_ndjson_compression format: %r')
+                              % self.stream_compression)
+        self.stream_max_size = self.get_builder_config('ndjson_max_size', 'html')
+        self.stream: ndjson.StreamWriter | None = None
+
+    def get_outdated_docs(self) -> Iterator[str]:
+        # Every build writes the stream again from the start, so every page
+        # must be written, however many have changed.
+        yield from self.env.found_docs
+
+    def prepare_writing(self, docnames: Set[str]) -> None:
+        super().prepare_writing(docnames)
+        self.stream = None
+
+    def write_page(self, pagename: str, filename: str, data: bytes | list[bytes],
+                   shared: Sequence[str] = (),
+                   body: bytes | list[bytes] | None = None) -> dict[str, Any]:
+        """Write a page's serialized context to the stream, as one line."""
+        if self.stream is None:
+            self.stream = ndjson.StreamWriter(
+                os.fspath(self.outdir), self.stream_basename, self.stream_compression,
+                self.precompress_level, self.stream_max_size)
+        self.stream.write(data)
+        digest = hashlib.sha256()
+        for piece in [data] if isinstance(data, bytes) else data:
+            digest.update(piece)
+        return {'file': self.stream.filename, 'hash': digest.hexdigest()}
+
+    def finish_pages(self) -> None:
+        super().finish_pages()
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def update_manifest(self, records: list[dict[str, Any]]) -> dict[str, list[str]]:
+        # Every build writes the whole stream, so there are no page files to
+        # keep track of.
+        return {'added': [], 'modified': [], 'removed': []}
+
 
 def setup(app: Sphinx) -> dict[str, Any]:
     app.require_sphinx('5.0')
     app.setup_extension('sphinx.builders.html')
     app.add_builder(JSONHTMLBuilder)
     app.add_builder(PickleHTMLBuilder)
+    app.add_builder(NDJSONHTMLBuilder)
+    app.add_config_value('html_translator_rewrites', False, 'html', bool)
+    app.add_config_value('html_body_cache_size', 64 * 1024 * 1024, '', int)
+    app.add_config_value('html_json_backend', 'auto', '', str)
+    app.add_config_value('html_parser_backend', 'html.parser', '', str)
+    app.add_config_value('html_pool_size', 0, '', int)
+    app.add_config_value('html_writer_threads', 0, '', int)
+    app.add_config_value('html_copy_method', 'reflink', '', str)
+    app.add_config_value('html_copy_env', True, '', bool)
+    app.add_config_value('html_hashed_images', False, 'html', bool)
+    app.add_config_value('html_image_store', '', '', str)
+    app.add_config_value('html_env_export', [], '', list)
+    app.add_config_value('html_pack', False, 'html', bool)
+    app.add_config_value('html_ndjson_compression', '', 'html', str)
+    app.add_config_value('html_ndjson_max_size', 0, 'html', int)
+    app.add_config_value('html_compact_context', False, 'html', bool)
+    app.add_config_value('html_split_body', False, 'html', bool)
+    app.add_config_value('html_search_shards', False, '', bool)
+    app.add_config_value('html_search_shard_prefix_length', 2, '', int)
+    app.add_config_value('html_precompress', [], 'html', list)
+    app.add_config_value('html_precompress_level', 6, 'html', int)
+    app.add_config_value('html_precompress_originals', True, 'html', bool)
+    app.add_config_value('html_instrumentation', False, '', bool)
+    app.add_config_value('html_instrumentation_report', '', '', str)
+    app.add_config_value('html_instrumentation_memory', False, '', bool)
+    app.add_config_value('html_large_body_threshold', 0, '', int)
+    app.add_config_value('html_large_body_chunk_size', 256 * 1024, '', int)
+    app.add_event('serializinghtml-page-timings')
     app.add_message_catalog(__name__, path.join(package_dir, 'locales'))
 
     return {
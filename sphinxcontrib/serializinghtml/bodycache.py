@@ -0,0 +1,101 @@
+"""A cache of post-processed page bodies that persists between builds.
+
+Pages are often written again with exactly the same body, for example when a
+configuration or toctree change makes Sphinx write every page. The cache maps
+the raw body and page filename to the body returned by
+:func:`~sphinxcontrib.serializinghtml.html_assists.postprocess_body`, so that
+those pages don't need to be parsed and rewritten again.
+
+Entries are kept as one file each in a directory (normally in the doctree
+directory), which keeps the cache safe to use from parallel writers.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from os import path
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Any
+
+#: the file in the cache directory recording what the entries depend on
+STAMP_FILENAME = 'stamp'
+
+
+class BodyCache:
+    """Disk-backed cache of post-processed page bodies.
+
+    *version* and *link_mappings* affect every entry: if either differs from
+    the ones the cache was written with, the cache is emptied. *max_size* is
+    the number of bytes of entries kept by :meth:`evict`.
+    """
+
+    def __init__(self, directory: str, version: str, link_mappings: dict[str, Any] | None,
+                 max_size: int) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.stamp = json.dumps({'version': version, 'link_mappings': link_mappings or {}},
+                                sort_keys=True)
+        os.makedirs(directory, exist_ok=True)
+        stamp_path = Path(directory, STAMP_FILENAME)
+        try:
+            current = stamp_path.read_text(encoding='utf-8') == self.stamp
+        except OSError:
+            current = False
+        if not current:
+            self.clear()
+            stamp_path.write_text(self.stamp, encoding='utf-8')
+
+    def entries(self) -> list[str]:
+        return [path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.endswith('.html')]
+
+    def clear(self) -> None:
+        for filename in self.entries():
+            os.unlink(filename)
+
+    def key(self, body: str, page_filename: str) -> str:
+        digest = hashlib.sha256(page_filename.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(body.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        filename = path.join(self.directory, key + '.html')
+        try:
+            with open(filename, encoding='utf-8', newline='') as f:
+                body = f.read()
+        except OSError:
+            return None
+        # Mark the entry as recently used, for evict().
+        os.utime(filename)
+        return body
+
+    def set(self, key: str, body: str) -> None:
+        filename = path.join(self.directory, key + '.html')
+        tmpname = f'{filename}.{os.getpid()}.tmp'
+        with open(tmpname, 'w', encoding='utf-8', newline='') as f:
+            f.write(body)
+        os.replace(tmpname, filename)
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache is no
+        larger than *max_size*.
+        """
+        entries = []
+        for filename in self.entries():
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, filename))
+        total = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total <= self.max_size:
+                break
+            os.unlink(filename)
+            total -= size
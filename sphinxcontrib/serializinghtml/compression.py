@@ -0,0 +1,51 @@
+"""Writing precompressed copies of the output files."""
+
+from __future__ import annotations
+
+import gzip
+import lzma
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from typing import BinaryIO
+
+#: the compression formats supported, by file suffix
+FORMATS = ('gz', 'xz')
+
+
+@contextmanager
+def open_output(filename: str, fmt: str = '', level: int = 6) -> Iterator[BinaryIO]:
+    """Open *filename* for writing binary data, compressed in the format
+    *fmt* (or uncompressed if *fmt* is empty).
+
+    The data is written to a temporary file which replaces *filename* once
+    all of it has been written. gzip files don't record a name or time, so
+    that the same content always compresses to the same file.
+    """
+    tmpname = f'{filename}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmpname, 'wb') as raw:
+            if fmt == 'gz':
+                with gzip.GzipFile(filename='', mode='wb', fileobj=raw,
+                                   compresslevel=level, mtime=0) as f:
+                    yield f  # type: ignore[misc]
+            elif fmt == 'xz':
+                with lzma.LZMAFile(raw, 'wb', preset=level) as f:
+                    yield f  # type: ignore[misc]
+            else:
+                yield raw
+    except BaseException:
+        os.unlink(tmpname)
+        raise
+    os.replace(tmpname, filename)
+
+
+def compress_file(filename: str, fmt: str, level: int = 6) -> None:
+    """Write a copy of *filename* compressed in the format *fmt*, next to it."""
+    with open(filename, 'rb') as src, open_output(f'{filename}.{fmt}', fmt, level) as dst:
+        shutil.copyfileobj(src, dst)
@@ -0,0 +1,82 @@
+"""Copying files into the output directory only when they have changed."""
+
+from __future__ import annotations
+
+import errno
+import filecmp
+import os
+import shutil
+import threading
+
+#: the ways of making copies
+COPY_METHODS = ('copy', 'reflink', 'hardlink')
+
+#: the ioctl that makes a copy-on-write clone of a file on Linux
+FICLONE = 0x40049409
+
+
+def reflink(source: str, dest: str) -> bool:
+    """Make *dest* a copy-on-write clone of *source*, if the file system
+    supports it. Return whether it did.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError as exc:
+            if exc.errno in {errno.EBADF, errno.EINVAL, errno.ENOTTY, errno.EOPNOTSUPP,
+                             errno.EXDEV, errno.ENOSYS}:
+                return False
+            raise
+    return True
+
+
+def copy_if_changed(source: str, dest: str, method: str = 'reflink') -> bool:
+    """Make *dest* a copy of *source*, unless it already is one, and return
+    whether a copy was made.
+
+    *dest* is taken to be a copy already if it is the same file (a hard
+    link) and *method* is ``'hardlink'``, or if it is another file with the
+    same size and modification time, or the same size and content. Copies
+    are made with *method*: ``'reflink'`` clones the file where the file
+    system supports it, and ``'hardlink'`` links to it where possible,
+    falling back to copying. Copies keep the source's modification time,
+    and replace *dest* atomically.
+    """
+    source_stat = os.stat(source)
+    try:
+        dest_stat = os.stat(dest)
+    except FileNotFoundError:
+        pass
+    else:
+        if (dest_stat.st_dev, dest_stat.st_ino) == (source_stat.st_dev, source_stat.st_ino):
+            # A hard link made with another method is replaced by a copy.
+            if method == 'hardlink':
+                return False
+        elif dest_stat.st_size == source_stat.st_size:
+            if dest_stat.st_mtime_ns == source_stat.st_mtime_ns:
+                return False
+            if method != 'hardlink' and filecmp.cmp(source, dest, shallow=False):
+                os.utime(dest, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+                return False
+
+    tmpname = f'{dest}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        if method == 'hardlink':
+            try:
+                os.link(source, tmpname)
+            except OSError:
+                shutil.copyfile(source, tmpname)
+        elif method != 'reflink' or not reflink(source, tmpname):
+            shutil.copyfile(source, tmpname)
+        if method != 'hardlink' or not os.path.samefile(source, tmpname):
+            os.utime(tmpname, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        os.replace(tmpname, dest)
+    except BaseException:
+        if os.path.lexists(tmpname):
+            os.unlink(tmpname)
+        raise
+    return True
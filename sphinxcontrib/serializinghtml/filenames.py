@@ -0,0 +1,28 @@
+"""The names of the files in the output of the serializing builders.
+
+These are shared by the builders and :mod:`sphinxcontrib.serializinghtml.reader`,
+so this module must not import Sphinx.
+"""
+
+from __future__ import annotations
+
+#: the filename for the "last build" file (for serializing builders)
+LAST_BUILD_FILENAME = 'last_build'
+
+#: the filename for the manifest of the pages written and their hashes
+MANIFEST_FILENAME = '_manifest.json'
+
+#: the filename for the pages added, modified and removed by the last build
+CHANGES_FILENAME = '_changes.json'
+
+#: the directory for the sharded search index
+SEARCH_SHARDS_DIRNAME = '_searchindex'
+
+#: the filename for the parts of the environment exported by html_env_export
+ENV_EXPORT_FILENAME = 'environment-export.pickle'
+
+#: the suffix for the files of page bodies, when written separately
+BODY_SUFFIX = '.body'
+
+#: the directory for the values shared by pages, in compact context mode
+SHARED_DIRNAME = '_shared'
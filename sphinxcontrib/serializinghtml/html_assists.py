@@ -1,12 +1,200 @@
-from bs4 import BeautifulSoup, element
-from html import escape
-from urllib.parse import urlparse
+from __future__ import annotations
+
+import re
+from array import array
+from html import escape, unescape
+from html.parser import HTMLParser
 from pathlib import PurePosixPath
+from typing import TYPE_CHECKING, Any, Callable, cast
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup, element
+from bs4.builder import HTMLTreeBuilder, builder_registry
+from docutils import nodes
+
+from sphinxcontrib.serializinghtml.instrumentation import NULL_TIMER
+
+if TYPE_CHECKING:
+    from sphinxcontrib.serializinghtml.instrumentation import NullTimer, PageTimer
+
+#: Transforms run over a page body by postprocess_body(), in order. Each
+#: entry is (name, markers, transform): the transform is only run if the
+#: markers pattern matches the raw HTML, and is called as
+#: transform(soup, **options), returning True if it edited the tree.
+BODY_TRANSFORMS: list[tuple[str, re.Pattern[str], Callable[..., bool]]] = []
+
+#: The BeautifulSoup tree builders the transforms can parse with, fastest
+#: first. html.parser is always available; lxml is used if it is installed.
+PARSERS = ("lxml", "html.parser")
+
+# Markup that lxml parses differently from html.parser even inside a
+# fragment: document-level tags (lxml drops everything after a stray
+# </body> or </html>), processing instructions, and the elements whose
+# content lxml reads as text, where html.parser parses markup in it.
+# Bodies containing any of it are parsed with html.parser.
+LXML_FALLBACK_RE = re.compile(
+    r'<(?:/?(?:html|head|body|frameset)\b|\?'
+    r'|(?:iframe|noembed|noframes|plaintext|textarea|title|xmp)\b)',
+    re.IGNORECASE)
+
+# The tags of a fragment, as html.parser tokenizes them, skipping comments,
+# declarations and the content of <script> and <style>.
+LXML_TAG_RE = re.compile(
+    r'<!--.*?-->|<(?P<raw>script|style)\b.*?</(?P=raw)\s*>|<![^>]*>'
+    r'|<(?P<end>/?)(?P<name>[a-zA-Z][^\t\n\f\r />]*)(?:"[^"]*"|\'[^\']*\'|[^\'">])*>',
+    re.DOTALL | re.IGNORECASE)
+
+#: the elements that have no content or end tag
+VOID_ELEMENTS = frozenset(HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS or ())
+
+#: the void elements lxml knows of; it gives the others (<wbr>, <source>,
+#: <embed> etc.) the content up to the end of their parent, unless their
+#: tag is self-closed
+LXML_VOID_ELEMENTS = frozenset({
+    "area", "base", "basefont", "br", "col", "frame", "hr", "img", "input", "isindex",
+    "link", "meta", "param",
+})
+
+_LXML_BLOCKS = frozenset({
+    "address", "article", "aside", "blockquote", "caption", "center", "col", "colgroup",
+    "dd", "details", "dialog", "dir", "div", "dl", "dt", "fieldset", "figcaption", "figure",
+    "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hgroup", "hr", "legend",
+    "li", "listing", "main", "menu", "nav", "ol", "p", "pre", "section", "summary", "table",
+    "tbody", "td", "tfoot", "th", "thead", "tr", "ul",
+})
+_LXML_HEADINGS = frozenset({"h1", "h2", "h3", "h4", "h5", "h6"})
+_LXML_TABLE_PARTS = frozenset({"tbody", "tfoot", "thead", "tr"})
+
+# The start tags at which lxml (libxml2) closes the element it is in, by the
+# name of that element, as browsers do for invalid nesting; html.parser
+# nests the new element instead. This covers the rules of current and older
+# libxml2 versions, erring on the side of caution: any block in a list, a
+# definition list, a heading or a paragraph is taken to close it. Bodies
+# where any of these tags follows the element are parsed with html.parser.
+LXML_CLOSED_BY: dict[str, frozenset[str]] = {
+    "p": _LXML_BLOCKS,
+    **dict.fromkeys(_LXML_HEADINGS, _LXML_BLOCKS),
+    "ul": _LXML_BLOCKS - {"li"},
+    "ol": _LXML_BLOCKS - {"li"},
+    "dl": _LXML_BLOCKS - {"dd", "dt"},
+    "a": frozenset({"a", "fieldset", "table", "td", "th"}),
+    "li": frozenset({"li"}),
+    "dt": frozenset({"dd", "dl", "dt"}),
+    "dd": frozenset({"dd", "dl", "dt"}),
+    "option": frozenset({"optgroup", "option"}),
+    "optgroup": frozenset({"optgroup"}),
+    "form": frozenset({"form"}),
+    "legend": frozenset({"fieldset"}),
+    "td": frozenset({"td", "th"}) | _LXML_TABLE_PARTS,
+    "th": frozenset({"td", "th"}) | _LXML_TABLE_PARTS,
+    "tr": _LXML_TABLE_PARTS,
+    "thead": frozenset({"tbody", "tfoot"}),
+    "tbody": frozenset({"tbody", "tfoot"}),
+    "tfoot": frozenset({"tbody"}),
+    "caption": frozenset({"col", "colgroup"}) | _LXML_TABLE_PARTS,
+    "colgroup": frozenset({"colgroup"}) | _LXML_TABLE_PARTS,
+    "col": frozenset({"col", "colgroup"}) | _LXML_TABLE_PARTS,
+    **dict.fromkeys(("menu", "dir", "address", "pre", "listing"),
+                    frozenset({"dl", "dt", "dd", "ul", "form", "li", "table", "fieldset"})),
+    **dict.fromkeys(("b", "big", "font", "i", "s", "small", "span", "strike", "tt", "u"),
+                    frozenset({"center", "p", "td", "th"})),
+}
+
+# An empty element put at the start of a body parsed with lxml, so that
+# lxml opens <body> before anything in the body: otherwise it drops leading
+# whitespace and moves leading <style>, <meta> and comments out of the body.
+LXML_SENTINEL = "<serializinghtml-root></serializinghtml-root>"
+
+_parser = "html.parser"
+
+
+def parser_available(name: str) -> bool:
+    return name in PARSERS and builder_registry.lookup(name) is not None
+
+
+def use_parser(name: str = "auto") -> str:
+    """Parse bodies and toctrees with the tree builder *name*, and return
+    the name of the tree builder used.
+
+    ``'auto'`` chooses the fastest tree builder installed. A tree builder
+    that isn't installed falls back to ``'html.parser'``.
+    """
+    global _parser
+    if name == "auto":
+        name = next(parser for parser in PARSERS if parser_available(parser))
+    elif not parser_available(name):
+        name = "html.parser"
+    _parser = name
+    return name
+
+
+def lxml_parses_alike(html: str) -> bool:
+    """Return whether lxml is known to parse the fragment *html* into the
+    same tree as html.parser. This errs on the side of caution, and only
+    knows the repairs of the libxml2 versions it has been checked against.
+
+    lxml repairs invalid nesting (such as a <div> in a <p>, or an unclosed
+    <li>) the way browsers do, where html.parser keeps it as it is, so the
+    tags must be properly nested and closed, none may be one that lxml
+    closes the element it is in at, and void elements lxml doesn't know of
+    must be self-closed.
+    """
+    if LXML_FALLBACK_RE.search(html):
+        return False
+    stack: list[str] = []
+    for match in LXML_TAG_RE.finditer(html):
+        name = match["name"]
+        if name is None:
+            continue
+        name = name.lower()
+        if match["end"]:
+            if not stack or stack.pop() != name:
+                return False
+        elif stack and name in LXML_CLOSED_BY.get(stack[-1], ()):
+            return False
+        elif match[0].endswith("/>") or name in LXML_VOID_ELEMENTS:
+            continue
+        elif name in VOID_ELEMENTS:
+            return False
+        else:
+            stack.append(name)
+    return not stack
+
+
+def parse_html(html: str) -> BeautifulSoup:
+    """Parse the HTML fragment *html* with the tree builder chosen by
+    use_parser().
+
+    Markup lxml_parses_alike() doesn't accept is parsed with html.parser,
+    so that whichever tree builder parses it, serialize_html() turns the
+    tree back into the HTML html.parser would, wherever
+    lxml_parses_alike() knows how lxml repairs markup.
+    """
+    if _parser == "lxml" and lxml_parses_alike(html):
+        soup = BeautifulSoup(LXML_SENTINEL + html, "lxml")
+        fragment_root(soup).contents[0].extract()
+        return soup
+    return BeautifulSoup(html, "html.parser")
+
+
+def fragment_root(soup: BeautifulSoup) -> element.Tag:
+    """Return the tag of *soup* whose children are the parsed fragment."""
+    if soup.builder.NAME == "lxml":
+        # lxml puts the fragment in the <body> of a document
+        return cast(element.Tag, soup.body)
+    return soup
+
+
+def serialize_html(soup: BeautifulSoup) -> str:
+    """Return the HTML fragment parsed by parse_html() into *soup*."""
+    return fragment_root(soup).decode_contents() if soup.builder.NAME == "lxml" else str(soup)
+
 
 def is_relative_url(url):
     parsed = urlparse(url)
     return not parsed.scheme and not parsed.netloc
 
+
 def clean_href(href: str) -> str:
     """ Make sure the href doesn't start or end with a / """
     if href[0] == "/":
@@ -15,6 +203,7 @@ def clean_href(href: str) -> str:
         href = href[:-1]
     return href
 
+
 def link_label(tag) -> str:
     """Return a plain-string label for a navigation link/section.
 
@@ -31,6 +220,7 @@ def link_label(tag) -> str:
     # Already a NavigableString / plain string.
     return str(tag)
 
+
 def section_links(parent_entry: element.Tag, list_entry: element.Tag) -> dict:
     section_result = []
     for child in list_entry.children:
@@ -48,6 +238,7 @@ def section_links(parent_entry: element.Tag, list_entry: element.Tag) -> dict:
                 "items": section_result
             }
 
+
 def convert_tag_to_link(item_entry: element.Tag) -> dict:
     # The a tag is a child of the li tag
     a_tag = item_entry.contents[0]
@@ -59,6 +250,7 @@ def convert_tag_to_link(item_entry: element.Tag) -> dict:
             "href": clean_href(a_tag["href"])
         }
 
+
 def process_section(result, child, section):
     # Is there a new unordered list within this section?
     if section != []:
@@ -72,16 +264,18 @@ def process_section(result, child, section):
     else:
         result.append(convert_tag_to_link(child))
 
+
 def process_ul_children(result, ul):
     for child in ul.children:
         if type(child) is element.Tag and child.name == "li":
             section = child.find_all("ul", limit=1)
             process_section(result, child, section)
 
+
 def convert_nav_html_to_json(html: str) -> list:
     result = []
-    soup = BeautifulSoup(html, "html.parser")
-    top_level_tags = soup.find_all(recursive=False)
+    soup = parse_html(html)
+    top_level_tags = fragment_root(soup).find_all(recursive=False)
 
     caption = None
     for tag in top_level_tags:
@@ -102,35 +296,151 @@ def convert_nav_html_to_json(html: str) -> list:
                 process_ul_children(result, tag)
     return result
 
-def escape_encoded_alt_text(html: str) -> str:
+
+def node_link_label(reference: nodes.reference, secnumber_suffix: str) -> str:
+    """Return the label link_label() reads for *reference* once it's rendered.
+
+    The translator writes the section number of a numbered toctree entry
+    in front of the reference text.
+    """
+    label = reference.astext()
+    if reference.get('secnumber'):
+        label = '.'.join(map(str, reference['secnumber'])) + secnumber_suffix + label
+    return label
+
+
+def entry_reference(list_item: nodes.list_item) -> nodes.reference:
+    # The reference is the first child of the compact paragraph in the list item
+    return cast(nodes.reference, cast(nodes.Element, list_item[0])[0])
+
+
+def convert_node_to_link(list_item: nodes.list_item,
+                         secnumber_suffix: str) -> dict[str, Any]:
+    reference = entry_reference(list_item)
+    return {
+            "type": "link",
+            "text": node_link_label(reference, secnumber_suffix),
+            "href": clean_href(reference.get('refuri') or "#"),
+        }
+
+
+def process_node_section(result: list[dict[str, Any]], list_item: nodes.list_item,
+                         secnumber_suffix: str) -> None:
+    # Mirrors process_section(): an entry with a nested list becomes a
+    # section of links, anything else a single link.
+    section = next(iter(list_item.findall(nodes.bullet_list, include_self=False)), None)
+    if section is not None:
+        if result != []:
+            result.append({"type": "divider"})
+        result.extend(({
+            "type": "section",
+            "text": node_link_label(entry_reference(list_item), secnumber_suffix),
+            "items": [convert_node_to_link(child, secnumber_suffix)
+                      for child in section.children if isinstance(child, nodes.list_item)],
+        }, {"type": "divider"}))
+    else:
+        result.append(convert_node_to_link(list_item, secnumber_suffix))
+
+
+def convert_nav_nodes_to_json(toctree: nodes.Element | None,
+                              secnumber_suffix: str = '. ') -> list[dict[str, Any]]:
+    """Convert a resolved toctree to the structure convert_nav_html_to_json()
+    returns for the same toctree rendered as HTML, without rendering it.
+    """
+    result: list[dict[str, Any]] = []
+    if toctree is None:
+        return result
+
+    caption = None
+    for child in toctree.children:
+        # Toctree captions are rendered as <p class="caption">
+        if isinstance(child, nodes.title):
+            caption = child.astext()
+        elif isinstance(child, nodes.bullet_list):
+            if caption is not None:
+                local_result: list[dict[str, Any]] = []
+                for list_item in child.children:
+                    if isinstance(list_item, nodes.list_item):
+                        process_node_section(local_result, list_item, secnumber_suffix)
+                result.append({
+                    "type": "section-group",
+                    "title": caption,
+                    "items": local_result,
+                })
+                caption = None
+            else:
+                for list_item in child.children:
+                    if isinstance(list_item, nodes.list_item):
+                        process_node_section(result, list_item, secnumber_suffix)
+    return result
+
+
+def escape_alt_text_in_tree(soup: BeautifulSoup, **options: Any) -> bool:
     edited = False
-    soup = BeautifulSoup(html, "html.parser")
     images = soup.find_all('img')
     for img in images:
         if img['alt'] != "":
             # At this point, Beautiful Soup has done what a browser does - decode
             # any encoded attributes. So we need to re-encode the string, see if
             # there are any ampersands and, if so, re-encode them again.
-            interim = escape(img['alt'])
-            if interim.find("&") != -1:
-                img['alt'] = escape(interim)
+            original = str(img['alt'])
+            alt = escape_encoded_text(original)
+            if alt is not original:
+                img['alt'] = alt
                 edited = True
+    return edited
+
 
-    if edited:
-        html = str(soup)
+def escape_encoded_alt_text(html: str) -> str:
+    soup = parse_html(html)
+    if escape_alt_text_in_tree(soup):
+        html = serialize_html(soup)
     return html
 
+
+def escape_encoded_text(text: str) -> str:
+    """Return *text* escaped twice if it contains anything HTML would decode.
+
+    This is the escaping the alt text and code transforms apply to decoded
+    strings; *text* itself is returned if it needs no escaping.
+    """
+    interim = escape(text)
+    if interim.find("&") != -1:
+        return escape(interim)
+    return text
+
+
+# A <span> that only contains text, as emitted by Pygments.
+LEAF_SPAN_RE = re.compile(r'(<span\b[^>]*>)([^<]+)(</span>)')
+
+
+def escape_encoded_span_text(html: str) -> str:
+    """Apply escape_encoded_text() to the text of every leaf <span> in *html*.
+
+    This works on the flat markup produced by the highlighter, so that
+    code blocks can be escaped without parsing them.
+    """
+    def escape_span(match: re.Match[str]) -> str:
+        text = unescape(match.group(2))
+        escaped = escape_encoded_text(text)
+        if escaped is text:
+            return match.group(0)
+        return match.group(1) + escape(escaped, quote=False) + match.group(3)
+    return LEAF_SPAN_RE.sub(escape_span, html)
+
+
 def re_encode_span_tags(span_tags, edited) -> bool:
     for span_tag in span_tags:
         content = span_tag.string
         if content is not None:
-            interim = escape(content)
-            if interim.find("&") != -1:
-                span_tag.string = escape(interim)
+            escaped = escape_encoded_text(content)
+            if escaped is not content:
+                span_tag.string = escaped
                 edited = True
     return edited
 
-def escape_encoded_pre_text(html: str) -> str:
+
+def escape_pre_text_in_tree(soup: BeautifulSoup, **options: Any) -> bool:
     # The reason for this function is because, when the browser loads the
     # HTML from the JSON data, it decodes any encoded attributes, such as
     # &lt; and &gt;, so we need to re-encode them to prevent the browser
@@ -144,7 +454,6 @@ def escape_encoded_pre_text(html: str) -> str:
     #    formatted with HTML entities, such as &lt; and &gt;.
 
     edited = False
-    soup = BeautifulSoup(html, "html.parser")
 
     span_tags = soup.find_all('span', class_="pre")
     edited = re_encode_span_tags(span_tags, edited)
@@ -154,10 +463,16 @@ def escape_encoded_pre_text(html: str) -> str:
         span_tags = pre_tag.find_all("span")
         edited = re_encode_span_tags(span_tags, edited)
 
-    if edited:
-        html = str(soup)
+    return edited
+
+
+def escape_encoded_pre_text(html: str) -> str:
+    soup = parse_html(html)
+    if escape_pre_text_in_tree(soup):
+        html = serialize_html(soup)
     return html
 
+
 def relative_traversal(from_path, to_path):
     from_parts = PurePosixPath(from_path).parts
     to_parts = PurePosixPath(to_path).parts
@@ -179,76 +494,392 @@ def relative_traversal(from_path, to_path):
     result = "../" * up_steps + "/".join(down_path)
     return result
 
-def process_relative_links(link: dict, page_filename: str, page_filename_head: str) -> bool:
-    # Check for relative links that need adjusting relative to where
-    # we are in the URL structure. Do this *before* performing the link
-    # mapping because the latter introduces more relative links to check.
-    href_link = link['href']
-    print(f"rewrite_hub_links: adjusting relative link: {href_link}")
+
+def adjust_relative_href(href_link: str, page_filename: str,
+                         page_filename_head: str) -> str | None:
+    """Return *href_link* adjusted for where the page is in the URL
+    structure, or None if it doesn't need adjusting.
+    """
     if page_filename_head != page_filename:
         if is_relative_url(href_link) and href_link[0] not in ['#', '/']:
             if href_link.startswith(page_filename_head):
                 # We need to drop the bit that goes up to the first / in
                 # the link because otherwise it gets duplicated when
                 # Next.js processes it.
-                link['href'] = href_link[len(page_filename_head)+1:]
-                print(f"rewrite_hub_links: new relative link: {link['href']}")
-                return True
+                return href_link[len(page_filename_head) + 1:]
             # If we aren't on the same path, and we don't have any traversal
             # at the start of the path, calculate the traversal required.
             if not href_link.startswith("../"):
                 new_path = relative_traversal(page_filename, href_link)
                 if new_path != href_link:
-                    link['href'] = new_path
-                    print(f"rewrite_hub_links: new relative link: {link['href']}")
-                    return True
-            print("rewrite_hub_links: no change")
-    else:
-        print("rewrite_hub_links: no relative link adjustment needed")
-    return False
-
-def process_link_mappings(link: dict, link_mappings: dict) -> bool:
-    for key in link_mappings:
-        # Check if the href starts with the key
-        if link['href'].startswith(key):
-            print(f"process_link_mappings: matched {link['href']} against mapping")
-            # We have a match, so strip the key from the href
-            link['href'] = link['href'].replace(key, "")
-            print(f"process_link_mappings: after removing key, we're left with {link['href']}")
-            # We also have to remove ".html" from the end of the link
-            link['href'] = link['href'].replace(".html", "")
-            # If we're just left with "index", or if we have nothing left, replace it
-            # with the value from the dictionary, which will also be the documentation
-            # root name
-            if link['href'] == "index" or link['href'] == "":
-                link['href'] = link_mappings[key]
-            # Do we have a link that ENDS with "/index"? If we do, remove it
-            if link['href'].endswith("/index"):
-                link['href'] = link['href'].replace("/index", "")
-            # Now put it all together ...
-            # So we should end up with something like:
-            # /library/onelab/onelab
-            # /library/laa/laa_getting_started
-            link['href'] = f"/library/{link_mappings[key]}/{link['href']}"
-            print(f"process_link_mappings: mapped to {link['href']}")
-            return True
-    return False
-
-def rewrite_hub_links(html: str, link_mappings: dict, page_filename: str) -> str:
-    print(f"rewrite_hub_links: page_filename={page_filename}")
+                    return new_path
+    return None
+
+
+def process_relative_links(link: element.Tag, page_filename: str,
+                           page_filename_head: str) -> bool:
+    # Check for relative links that need adjusting relative to where
+    # we are in the URL structure. Do this *before* performing the link
+    # mapping because the latter introduces more relative links to check.
+    new_path = adjust_relative_href(str(link['href']), page_filename, page_filename_head)
+    if new_path is None:
+        return False
+    link['href'] = new_path
+    return True
+
+
+def map_href(href: str, key: str, root: str) -> str:
+    """Return the Hub path for *href*, which starts with the mapping *key*
+    for the documentation root *root*.
+    """
+    # We have a match, so strip the key from the href
+    href = href.replace(key, "")
+    # We also have to remove ".html" from the end of the link
+    href = href.replace(".html", "")
+    # If we're just left with "index", or if we have nothing left, replace it
+    # with the value from the dictionary, which will also be the documentation
+    # root name
+    if href == "index" or href == "":
+        href = root
+    # Do we have a link that ENDS with "/index"? If we do, remove it
+    if href.endswith("/index"):
+        href = href.replace("/index", "")
+    # Now put it all together ...
+    # So we should end up with something like:
+    # /library/onelab/onelab
+    # /library/laa/laa_getting_started
+    return f"/library/{root}/{href}"
+
+
+class LinkRewriter:
+    """Rewrites links the way rewrite_hub_links() does, for a whole build.
+
+    The link mappings are compiled into a character trie, so the mapping for
+    a link is found by its longest matching prefix, in time proportional to
+    the length of the link rather than the number of mappings. Mapped links
+    and relative link adjustments are memoized, because the same links occur
+    on many pages.
+    """
+
+    def __init__(self, link_mappings: dict[str, str] | None) -> None:
+        self.link_mappings = dict(link_mappings or {})
+        # Each trie node maps a character to the next node; the "" entry of
+        # a node holds the mapping key that ends there.
+        self.trie: dict[str, Any] = {}
+        for key in self.link_mappings:
+            node = self.trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[""] = key
+        self.mapped: dict[str, str | None] = {}
+        self.adjusted: dict[tuple[str, str], str | None] = {}
+
+    def longest_prefix(self, href: str) -> str | None:
+        """Return the longest mapping key that *href* starts with."""
+        node = self.trie
+        match = node.get("")
+        for char in href:
+            child = node.get(char)
+            if child is None:
+                break
+            node = child
+            match = node.get("", match)
+        return match
+
+    def map_href(self, href: str) -> str | None:
+        """Return the Hub path for *href*, or None if no mapping matches."""
+        try:
+            return self.mapped[href]
+        except KeyError:
+            pass
+        key = self.longest_prefix(href)
+        mapped = None if key is None else map_href(href, key, self.link_mappings[key])
+        self.mapped[href] = mapped
+        return mapped
+
+    def adjust_relative_href(self, href: str, page_filename: str) -> str | None:
+        """Memoized adjust_relative_href()."""
+        try:
+            return self.adjusted[page_filename, href]
+        except KeyError:
+            pass
+        page_filename_head, _, _ = page_filename.partition("/")
+        adjusted = adjust_relative_href(href, page_filename, page_filename_head)
+        self.adjusted[page_filename, href] = adjusted
+        return adjusted
+
+    def rewrite(self, href: str, page_filename: str) -> str:
+        """Return *href* as rewritten on the page *page_filename*."""
+        adjusted = self.adjust_relative_href(href, page_filename)
+        if adjusted is not None:
+            href = adjusted
+        mapped = self.map_href(href)
+        if mapped is not None:
+            href = mapped
+        return href
+
+
+def get_link_rewriter(link_mappings: dict[str, str] | LinkRewriter | None) -> LinkRewriter:
+    if isinstance(link_mappings, LinkRewriter):
+        return link_mappings
+    return LinkRewriter(link_mappings)
+
+
+def process_link_mappings(link: element.Tag,
+                          link_mappings: dict[str, str] | LinkRewriter) -> bool:
+    mapped = get_link_rewriter(link_mappings).map_href(str(link['href']))
+    if mapped is None:
+        return False
+    link['href'] = mapped
+    return True
+
+
+def rewrite_href(href: str, link_mappings: dict[str, str] | LinkRewriter,
+                 page_filename: str) -> str:
+    """Return *href* as rewrite_hub_links() would rewrite it on this page."""
+    return get_link_rewriter(link_mappings).rewrite(href, page_filename)
+
+
+def rewrite_hub_links_in_tree(soup: BeautifulSoup,
+                              link_mappings: dict[str, str] | LinkRewriter,
+                              page_filename: str, **options: Any) -> bool:
+    rewriter = get_link_rewriter(link_mappings)
     edited = False
-    soup = BeautifulSoup(html, "html.parser")
     links = soup.find_all('a')
-    # Need to calculate what the start of page_filename looks like
-    # up to the first separator.
-    page_filename_head, _, _ = page_filename.partition("/")
-    print(f"rewrite_hub_links: page_filename_head={page_filename_head}")
     for link in links:
-        if process_relative_links(link, page_filename, page_filename_head):
+        # Adjust relative links *before* performing the link mapping
+        # because the latter introduces more relative links to check.
+        href = str(link['href'])
+        adjusted = rewriter.adjust_relative_href(href, page_filename)
+        if adjusted is not None:
+            href = adjusted
             edited = True
-        if process_link_mappings(link, link_mappings):
+        mapped = rewriter.map_href(href)
+        if mapped is not None:
+            href = mapped
             edited = True
+        link['href'] = href
+    return edited
+
 
-    if edited:
-        html = str(soup)
+def rewrite_hub_links(html: str, link_mappings: dict[str, str] | LinkRewriter,
+                      page_filename: str) -> str:
+    soup = parse_html(html)
+    if rewrite_hub_links_in_tree(soup, link_mappings, page_filename):
+        html = serialize_html(soup)
     return html
+
+
+def register_body_transform(name: str, markers: tuple[str, ...],
+                            transform: Callable[..., bool]) -> None:
+    """Add a transform to the end of the postprocess_body() pipeline.
+
+    The transform is skipped for bodies that contain none of the *markers*,
+    compared case-insensitively, as tag names are. The markers must not
+    depend on how attributes are quoted or spaced.
+    """
+    pattern = re.compile("|".join(map(re.escape, markers)), re.IGNORECASE)
+    BODY_TRANSFORMS.append((name, pattern, transform))
+
+
+def transform_body(html: str, timer: PageTimer | NullTimer = NULL_TIMER,
+                   serialize: bool = False, **options: Any) -> tuple[str, bool]:
+    """Run the registered body transforms over a single parse of *html*,
+    and return the result and whether any transform edited it.
+
+    *html* is returned as it is if no transform edited it, unless
+    *serialize* is set, in which case it is always parsed and serialized.
+    """
+    pending = [(name, transform) for name, markers, transform in BODY_TRANSFORMS
+               if markers.search(html)]
+    if not pending and not serialize:
+        return html, False
+    with timer.stage("body:parse"):
+        soup = parse_html(html)
+    edited = False
+    for name, transform in pending:
+        with timer.stage(f"body:{name}"):
+            if transform(soup, **options):
+                edited = True
+    if edited or serialize:
+        with timer.stage("body:serialize"):
+            html = serialize_html(soup)
+    return html, edited
+
+
+def postprocess_body(html: str, timer: PageTimer | NullTimer = NULL_TIMER,
+                     **options: Any) -> str:
+    """Run the registered body transforms over a single parse of *html*.
+
+    The body is only parsed if at least one transform has a marker in the
+    raw HTML, and only re-serialized if a transform edited the tree, so the
+    result is the same as chaining escape_encoded_alt_text(),
+    escape_encoded_pre_text() and rewrite_hub_links(). The one exception
+    is whitespace split by a stray end tag: the chain collapses it when it
+    re-parses an edited body, a single parse keeps it as it is. Parsing,
+    each transform and serialization are timed as stages of *timer*.
+    """
+    return transform_body(html, timer, **options)[0]
+
+
+# The elements postprocess_body_chunks() splits bodies inside of: block
+# containers, which no transform edits or looks inside of.
+SPLITTABLE_TAGS = frozenset({
+    "section", "div", "dl", "dd", "ul", "ol", "li", "blockquote", "article", "aside",
+    "main", "nav", "details", "figure", "header", "footer",
+})
+
+
+class BodySegment:
+    """A splittable element of a body, whose content is split into
+    segments: ranges of the body to transform as one, and elements to
+    split further.
+    """
+
+    __slots__ = ("name", "start", "content_start", "segments", "run_start")
+
+    def __init__(self, name: str, start: int, content_start: int) -> None:
+        self.name = name
+        self.start = start
+        self.content_start = content_start
+        self.segments: list[tuple[int, int] | BodySegment] = []
+        # the start of the range being gathered
+        self.run_start = content_start
+
+    def add_child(self, end: int, chunk_size: int) -> None:
+        """End the range being gathered after a child ending at *end*, if it
+        has grown to *chunk_size*.
+        """
+        if end - self.run_start >= chunk_size:
+            self.segments.append((self.run_start, end))
+            self.run_start = end
+
+    def add_segment(self, child: BodySegment, end: int) -> None:
+        if child.start > self.run_start:
+            self.segments.append((self.run_start, child.start))
+        self.segments.append(child)
+        self.run_start = end
+
+    def finish(self, end: int) -> None:
+        if end > self.run_start:
+            self.segments.append((self.run_start, end))
+
+
+class BodyScanner(HTMLParser):
+    """Finds where a body can be split into pieces of about *chunk_size*
+    characters that parse the same on their own as in the whole body.
+
+    This tokenizes the body as BeautifulSoup's html.parser tree builder
+    does, but keeps no tree, only the splittable elements of at least
+    *chunk_size* characters. Bodies whose tags aren't properly nested,
+    which html.parser tree builders repair, aren't split.
+    """
+
+    def __init__(self, html: str, chunk_size: int) -> None:
+        super().__init__(convert_charrefs=False)
+        self.html = html
+        self.chunk_size = chunk_size
+        self.line_starts = array("q", [0])
+        start = html.find("\n")
+        while start != -1:
+            self.line_starts.append(start + 1)
+            start = html.find("\n", start + 1)
+        self.root = BodySegment("", 0, 0)
+        self.stack = [self.root]
+        self.nested = True
+
+    def position(self) -> int:
+        line, column = self.getpos()
+        return self.line_starts[line - 1] + column
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        start = self.position()
+        content_start = start + len(self.get_starttag_text() or "")
+        if tag in VOID_ELEMENTS:
+            self.stack[-1].add_child(content_start, self.chunk_size)
+        else:
+            self.stack.append(BodySegment(tag, start, content_start))
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        start = self.position()
+        self.stack[-1].add_child(start + len(self.get_starttag_text() or ""),
+                                 self.chunk_size)
+
+    def handle_endtag(self, tag: str) -> None:
+        start = self.position()
+        element = self.stack[-1]
+        if tag != element.name:
+            self.nested = False
+            return
+        end = self.html.index(">", start) + 1
+        self.stack.pop()
+        parent = self.stack[-1]
+        if element.name in SPLITTABLE_TAGS and end - element.start >= self.chunk_size:
+            element.finish(start)
+            parent.add_segment(element, end)
+        else:
+            parent.add_child(end, self.chunk_size)
+
+    def scan(self) -> list[tuple[int, int] | BodySegment] | None:
+        """Return the segments of the body, or None if it can't be split."""
+        self.feed(self.html)
+        self.close()
+        if not self.nested or len(self.stack) > 1:
+            return None
+        self.root.finish(len(self.html))
+        return self.root.segments
+
+
+def is_well_nested(html: str) -> bool:
+    """Return whether the tags in *html* are properly nested and closed, so
+    that it can be parsed on its own without html.parser repairing it.
+    """
+    return BodyScanner(html, len(html) + 1).scan() is not None
+
+
+def postprocess_body_chunks(html: str, chunk_size: int = 256 * 1024,
+                            timer: PageTimer | NullTimer = NULL_TIMER,
+                            **options: Any) -> list[str] | None:
+    """Return the pieces of postprocess_body(html), or None if it returns
+    *html* as it is.
+
+    Rather than parsing the whole body at once, this splits it inside of
+    block containers into pieces of about *chunk_size* characters, and
+    runs the transforms over one piece at a time, so that only one piece's
+    tree is in memory. The pieces joined are the same as the result of
+    postprocess_body().
+    """
+    with timer.stage("body:scan"):
+        segments = BodyScanner(html, chunk_size).scan()
+    if segments is None:
+        result, edited = transform_body(html, timer, **options)
+        return [result] if edited else None
+
+    pieces: list[str] = []
+    edited = False
+
+    def add_segments(segments: list[tuple[int, int] | BodySegment]) -> None:
+        nonlocal edited
+        for segment in segments:
+            if isinstance(segment, tuple):
+                start, end = segment
+                piece, piece_edited = transform_body(html[start:end], timer, serialize=True,
+                                                     **options)
+                pieces.append(piece)
+                edited = edited or piece_edited
+            else:
+                # the start tag as the parser writes it, without the end tag
+                # it adds
+                start_tag = html[segment.start:segment.content_start]
+                start_tag = serialize_html(parse_html(start_tag))
+                pieces.append(start_tag[:-len(f"</{segment.name}>")])
+                add_segments(segment.segments)
+                pieces.append(f"</{segment.name}>")
+
+    add_segments(segments)
+    return pieces if edited else None
+
+
+register_body_transform("alt_text", ("<img",), escape_alt_text_in_tree)
+register_body_transform("pre_text", ("<pre", "<span"), escape_pre_text_in_tree)
+register_body_transform("hub_links", ("<a",), rewrite_hub_links_in_tree)
@@ -0,0 +1,93 @@
+"""Naming output images by their content.
+
+An image named by a hash of its content never changes once it has been
+written, so it can be served with an immutable URL, and is never copied
+again: an image that is already in the output directory is up to date.
+Identical images, whatever they are called and whichever documents use them,
+become one output file.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from os import path
+from typing import TYPE_CHECKING
+
+from sphinxcontrib.serializinghtml import copying
+
+if TYPE_CHECKING:
+    from typing import Any
+
+#: the number of hex digits of the SHA-256 hash in the image names
+HASH_LENGTH = 20
+
+
+def hashed_name(filename: str, digest: str) -> str:
+    """Return the content-addressed name of the image *filename*."""
+    return digest[:HASH_LENGTH] + path.splitext(filename)[1].lower()
+
+
+def file_digest(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ImageHashes:
+    """The hashes of image files, kept in *filename* between builds so that
+    only new and modified images are read.
+
+    A file's hash is read again if its size or modification time changes.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.changed = False
+        try:
+            with open(filename, encoding='utf-8') as f:
+                self.hashes: dict[str, list[Any]] = json.load(f)
+        except (OSError, ValueError):
+            self.hashes = {}
+
+    def digest(self, filename: str) -> str:
+        """Return the SHA-256 hash of *filename*, as hex digits."""
+        stat = os.stat(filename)
+        entry = self.hashes.get(filename)
+        if entry is not None and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+        digest = file_digest(filename)
+        self.hashes[filename] = [stat.st_size, stat.st_mtime_ns, digest]
+        self.changed = True
+        return digest
+
+    def save(self) -> None:
+        if not self.changed:
+            return
+        tmpname = f'{self.filename}.{os.getpid()}.tmp'
+        with open(tmpname, 'w', encoding='utf-8') as f:
+            json.dump(self.hashes, f)
+        os.replace(tmpname, self.filename)
+        self.changed = False
+
+
+def copy_image(source: str, dest: str, store: str = '', method: str = 'reflink') -> bool:
+    """Copy the content-addressed image *source* to *dest*, unless *dest*
+    already exists, and return whether a copy was made.
+
+    With a *store* directory, the image is kept there under the same name,
+    and *dest* is a hard link to it where possible, so that projects sharing
+    the store share the image files too.
+    """
+    if path.exists(dest):
+        return False
+    if store:
+        stored = path.join(store, path.basename(dest))
+        if not path.exists(stored):
+            os.makedirs(store, exist_ok=True)
+            copying.copy_if_changed(source, stored, method)
+        source, method = stored, 'hardlink'
+    return copying.copy_if_changed(source, dest, method)
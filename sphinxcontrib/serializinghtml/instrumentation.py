@@ -0,0 +1,120 @@
+"""Per-page timing instrumentation for the serializing builders."""
+
+from __future__ import annotations
+
+import math
+from contextlib import contextmanager, nullcontext
+from operator import itemgetter
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from contextlib import AbstractContextManager
+    from typing import Any
+
+
+class PageTimer:
+    """Collects the time spent in each stage of writing one page, and the
+    sizes of what was written.
+    """
+
+    enabled = True
+
+    def __init__(self, pagename: str) -> None:
+        self.pagename = pagename
+        self.timings: dict[str, float] = {}
+        self.sizes: dict[str, int] = {}
+        self.start = perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + perf_counter() - start
+
+    def size(self, name: str, size: int) -> None:
+        self.sizes[name] = size
+
+    def record(self) -> dict[str, Any]:
+        """Return the timings as a JSON serializable dictionary."""
+        return {
+            'page': self.pagename,
+            'total': perf_counter() - self.start,
+            'timings': self.timings,
+            'sizes': self.sizes,
+        }
+
+
+class NullTimer:
+    """Stand-in for PageTimer when instrumentation is off."""
+
+    enabled = False
+
+    def __init__(self) -> None:
+        self._stage = nullcontext()
+
+    def stage(self, name: str) -> AbstractContextManager[None]:
+        return self._stage
+
+    def size(self, name: str, size: int) -> None:
+        pass
+
+
+#: the shared timer used when instrumentation is off
+NULL_TIMER = NullTimer()
+
+#: the sizes recorded per page that are peaks, rather than amounts written
+PEAK_SIZES = frozenset({'peak_memory'})
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Return the nearest-rank *percent* percentile of sorted *values*."""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def summarize(records: Iterable[dict[str, Any]], slowest: int = 10) -> dict[str, Any]:
+    """Summarize page records into a build performance report.
+
+    The report gives the total time and output size per stage, percentiles
+    of the time per page (overall and per stage) and of the peak sizes (such
+    as the peak memory) per page, and the *slowest* pages.
+    """
+    records = list(records)
+    stage_times: dict[str, list[float]] = {}
+    sizes: dict[str, int] = {}
+    peaks: dict[str, list[float]] = {}
+    for record in records:
+        for stage, elapsed in record['timings'].items():
+            stage_times.setdefault(stage, []).append(elapsed)
+        for name, size in record['sizes'].items():
+            if name in PEAK_SIZES:
+                peaks.setdefault(name, []).append(size)
+            else:
+                sizes[name] = sizes.get(name, 0) + size
+
+    def distribution(values: list[float]) -> dict[str, float]:
+        values = sorted(values)
+        return {
+            'total': math.fsum(values),
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p99': percentile(values, 99),
+            'max': values[-1] if values else 0.0,
+        }
+
+    by_total = sorted(records, key=itemgetter('total'), reverse=True)
+    return {
+        'pages': len(records),
+        'total': distribution([record['total'] for record in records]),
+        'stages': {stage: distribution(values)
+                   for stage, values in sorted(stage_times.items())},
+        'sizes': sizes,
+        'peaks': {name: distribution(values) for name, values in sorted(peaks.items())},
+        'slowest': by_total[:slowest],
+    }
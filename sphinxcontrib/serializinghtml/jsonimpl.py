@@ -1,10 +1,31 @@
-"""JSON serializer implementation wrapper."""
+"""JSON serializer implementation wrapper.
+
+The encoding is done by a backend: the standard library's :mod:`json`, or
+:mod:`simplejson` (whose C speedups are faster at encoding large documents)
+when it is installed. Both produce identical output. Translation proxies are
+turned into strings by :func:`normalize` before encoding, so that neither
+backend needs a per-object ``default()`` callback.
+"""
 
 from __future__ import annotations
 
 import json
 from collections import UserString
-from typing import IO, Any
+from typing import IO, Any, cast
+
+try:
+    import simplejson
+except ImportError:
+    simplejson_available = False
+else:
+    simplejson_available = True
+
+#: the backend options that make simplejson encode exactly like json
+_SIMPLEJSON_OPTIONS = {
+    'allow_nan': True,
+    'namedtuple_as_object': False,
+    'use_decimal': False,
+}
 
 
 class SphinxJSONEncoder(json.JSONEncoder):
@@ -15,14 +36,67 @@ class SphinxJSONEncoder(json.JSONEncoder):
         return super().default(obj)
 
 
+def _json_dumps(obj: Any, *args: Any, **kwds: Any) -> str:
+    return json.dumps(obj, *args, **kwds)
+
+
+def _simplejson_dumps(obj: Any, *args: Any, **kwds: Any) -> str:
+    return simplejson.dumps(obj, *args, **{**_SIMPLEJSON_OPTIONS, **kwds})
+
+
+#: the available backends, by name
+BACKENDS = {'json': _json_dumps}
+if simplejson_available:
+    BACKENDS['simplejson'] = _simplejson_dumps
+
+_dumps = _json_dumps
+
+
+def use_backend(name: str = 'auto') -> str:
+    """Encode with the backend *name*, and return the name of the backend
+    used.
+
+    ``'auto'`` chooses the fastest backend installed. A backend that isn't
+    installed falls back to ``'json'``.
+    """
+    global _dumps
+    if name == 'auto':
+        name = 'simplejson' if 'simplejson' in BACKENDS else 'json'
+    elif name not in BACKENDS:
+        name = 'json'
+    _dumps = BACKENDS[name]
+    return name
+
+
+def normalize(obj: Any) -> Any:
+    """Return *obj* with translation proxies replaced by strings.
+
+    Containers that don't hold any proxies are returned as they are.
+    """
+    if isinstance(obj, UserString):
+        return str(obj)
+    if isinstance(obj, dict):
+        normalized = None
+        for key, value in obj.items():
+            new_value = normalize(value)
+            if new_value is not value:
+                if normalized is None:
+                    normalized = dict(obj)
+                normalized[key] = new_value
+        return obj if normalized is None else normalized
+    if isinstance(obj, (list, tuple)):
+        items = [normalize(value) for value in obj]
+        if any(new is not old for new, old in zip(items, obj)):
+            return items
+    return obj
+
+
 def dump(obj: Any, file: IO[str] | IO[bytes], *args: Any, **kwds: Any) -> None:
-    kwds['cls'] = SphinxJSONEncoder
-    json.dump(obj, file, *args, **kwds)
+    cast('IO[str]', file).write(_dumps(normalize(obj), *args, **kwds))
 
 
 def dumps(obj: Any, *args: Any, **kwds: Any) -> str:
-    kwds['cls'] = SphinxJSONEncoder
-    return json.dumps(obj, *args, **kwds)
+    return _dumps(normalize(obj), *args, **kwds)
 
 
 def load(*args: Any, **kwds: Any) -> Any:
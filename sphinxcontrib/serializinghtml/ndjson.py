@@ -0,0 +1,102 @@
+"""Writing pages as a stream of newline-delimited JSON.
+
+Each page is written to the stream as soon as it has been serialized, so
+the memory used doesn't grow with the number of pages. The stream can be
+rotated by size into numbered parts, and compressed as it is written.
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+from os import path
+from typing import TYPE_CHECKING
+
+from sphinxcontrib.serializinghtml import compression
+
+if TYPE_CHECKING:
+    from contextlib import AbstractContextManager
+    from typing import BinaryIO
+
+#: the suffix of the stream files, before any compression suffix
+SUFFIX = '.ndjson'
+
+
+class StreamWriter:
+    """Writes lines to ``{basename}.ndjson`` in *directory*, compressed in
+    the format *fmt* (or uncompressed if *fmt* is empty).
+
+    With a *max_size*, a part holds at most *max_size* bytes of uncompressed
+    lines (or a single line, if it is bigger), and the parts are written to
+    ``{basename}-00001.ndjson``, ``{basename}-00002.ndjson`` and so on.
+    Each part replaces the file of the same name once it is complete.
+    """
+
+    def __init__(self, directory: str, basename: str, fmt: str = '', level: int = 6,
+                 max_size: int = 0) -> None:
+        self.directory = directory
+        self.basename = basename
+        self.fmt = fmt
+        self.level = level
+        self.max_size = max_size
+        #: the files written, relative to *directory*
+        self.filenames: list[str] = []
+        #: the number of lines in the current part
+        self.lines = 0
+        self.size = 0
+        self.context: AbstractContextManager[BinaryIO] | None = None
+        self.file: BinaryIO | None = None
+
+    @property
+    def filename(self) -> str:
+        """The name of the part being written, relative to *directory*."""
+        return self.filenames[-1]
+
+    def part_name(self, number: int) -> str:
+        suffix = f'{SUFFIX}.{self.fmt}' if self.fmt else SUFFIX
+        if self.max_size:
+            return f'{self.basename}-{number:05d}{suffix}'
+        return f'{self.basename}{suffix}'
+
+    def open_part(self) -> None:
+        self.filenames.append(self.part_name(len(self.filenames) + 1))
+        self.context = compression.open_output(
+            path.join(self.directory, self.filename), self.fmt, self.level)
+        self.file = self.context.__enter__()
+        self.lines = self.size = 0
+
+    def close_part(self) -> None:
+        if self.context is not None:
+            context, self.context, self.file = self.context, None, None
+            context.__exit__(None, None, None)
+
+    def write(self, line: bytes | list[bytes]) -> None:
+        """Write *line* (or the list of its pieces), which must not contain a
+        newline, to the stream.
+        """
+        pieces = [line] if isinstance(line, bytes) else line
+        size = sum(map(len, pieces))
+        if self.file is None or (
+                self.max_size and self.lines and self.size + size + 1 > self.max_size):
+            self.close_part()
+            self.open_part()
+        assert self.file is not None
+        self.file.writelines(pieces)
+        self.file.write(b'\n')
+        self.lines += 1
+        self.size += size + 1
+
+    def close(self) -> list[str]:
+        """Finish the stream, remove the parts (and unfinished parts) left
+        from earlier streams, and return the names of the files written.
+        """
+        if not self.filenames:
+            self.open_part()
+        self.close_part()
+        written = set(self.filenames)
+        for filename in glob.glob(path.join(glob.escape(self.directory),
+                                            glob.escape(self.basename) + '*' + SUFFIX + '*')):
+            name = path.basename(filename)
+            if name not in written:
+                os.unlink(filename)
+        return self.filenames
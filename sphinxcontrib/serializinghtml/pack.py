@@ -0,0 +1,83 @@
+"""The packed output format.
+
+A pack is two files: a data file holding the payloads of all the output files
+back to back, and an index mapping each output file's name to the offset and
+length of its payload in the data file. Both are laid out so that they can be
+used through :mod:`mmap` without reading them in full; see
+:mod:`sphinxcontrib.serializinghtml.reader`.
+
+The data file starts with a header (magic, version, generation) followed by
+the payloads. The index file starts with a header (magic, version, format,
+generation, entry count), followed by a table of fixed-size entries sorted
+by name, followed by the UTF-8 encoded names. The generation is the same in
+both files, so that a reader can tell if it has a data file and an index from
+different builds.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import struct
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+#: the filename for the packed payloads
+PACK_DATA_FILENAME = '_pages.pack'
+
+#: the filename for the index of the packed payloads
+PACK_INDEX_FILENAME = '_pages.index'
+
+VERSION = 1
+
+#: the serialization formats of the payloads
+FORMAT_JSON = 0
+FORMAT_PICKLE = 1
+
+DATA_MAGIC = b'SHPD'
+INDEX_MAGIC = b'SHPI'
+
+#: magic, version, reserved, generation
+DATA_HEADER = struct.Struct('<4sHHQ')
+#: magic, version, format, generation, number of entries
+INDEX_HEADER = struct.Struct('<4sHHQI')
+#: name offset, name length, payload offset, payload length
+INDEX_ENTRY = struct.Struct('<IIQQ')
+
+
+def write_pack(data_filename: str, index_filename: str,
+               files: Iterable[tuple[str, str]], fmt: int) -> None:
+    """Pack *files*, an iterable of (name, filename) pairs, into the data file
+    and index *data_filename* and *index_filename*.
+
+    The payloads are copied from the files in turn, without loading them
+    all. The index is replaced after the data file, and both are replaced
+    atomically.
+    """
+    generation = time.time_ns()
+    entries = []
+    data_tmpname = f'{data_filename}.{os.getpid()}.tmp'
+    with open(data_tmpname, 'wb') as data:
+        data.write(DATA_HEADER.pack(DATA_MAGIC, VERSION, 0, generation))
+        for name, filename in sorted(files, key=lambda file: file[0].encode('utf-8')):
+            offset = data.tell()
+            with open(filename, 'rb') as f:
+                shutil.copyfileobj(f, data)
+            entries.append((name.encode('utf-8'), offset, data.tell() - offset))
+
+    table = bytearray()
+    names = bytearray()
+    for encoded_name, offset, length in entries:
+        table += INDEX_ENTRY.pack(len(names), len(encoded_name), offset, length)
+        names += encoded_name
+    index_tmpname = f'{index_filename}.{os.getpid()}.tmp'
+    with open(index_tmpname, 'wb') as index:
+        index.write(INDEX_HEADER.pack(INDEX_MAGIC, VERSION, fmt, generation, len(entries)))
+        index.write(table)
+        index.write(names)
+
+    os.replace(data_tmpname, data_filename)
+    os.replace(index_tmpname, index_filename)
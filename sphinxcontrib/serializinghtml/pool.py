@@ -0,0 +1,91 @@
+"""Post-processing and serializing page contexts in worker processes.
+
+Writing a page is dominated by pure-Python work (the html_assists rewrites
+and encoding the context), so the builder can hand it to a pool of forked
+worker processes. The workers share the builder's state as it was when they
+were forked; the serialized pages come back to the builder in the order they
+were submitted, so the output is the same as writing the pages one by one.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+from sphinxcontrib.serializinghtml.instrumentation import NULL_TIMER, PageTimer
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from concurrent.futures import Future
+    from typing import Any
+
+    from sphinxcontrib.serializinghtml import SerializingHTMLBuilder
+
+    #: the serialized page, its body if written separately (either may be
+    #: a list of pieces), and the timings and sizes recorded by the worker
+    PageResult = tuple[bytes | list[bytes], bytes | list[bytes] | None,
+                       dict[str, float], dict[str, int]]
+
+#: whether worker processes can be forked on this platform
+pool_available = 'fork' in multiprocessing.get_all_start_methods()
+
+_builder: SerializingHTMLBuilder | None = None
+
+
+def _init_worker(builder: SerializingHTMLBuilder) -> None:
+    global _builder
+    _builder = builder
+
+
+def _process_page(ctx: dict[str, Any], page_filename: str, timed: bool) -> PageResult:
+    assert _builder is not None
+    timer = PageTimer(page_filename) if timed else NULL_TIMER
+    data, body = _builder.process_page_context(ctx, page_filename, timer)
+    if timed:
+        return data, body, timer.timings, timer.sizes  # type: ignore[union-attr]
+    return data, body, {}, {}
+
+
+class PagePool:
+    """A pool of *size* worker processes forked from *builder*, which is
+    created before the builder starts any thread.
+
+    At most a few pages per worker are in flight at once; beyond that,
+    :meth:`submit` waits for the oldest page to finish.
+    """
+
+    def __init__(self, builder: SerializingHTMLBuilder, size: int) -> None:
+        self.executor = ProcessPoolExecutor(
+            size, mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker, initargs=(builder,))
+        # The executor forks all its workers on the first submit; do it now,
+        # while the builder has no threads that a forked worker could find
+        # holding a lock.
+        self.executor.submit(int)
+        self.limit = size * 4
+        self.pending: deque[tuple[Future[PageResult], Callable[[PageResult], None]]] = deque()
+
+    def submit(self, ctx: dict[str, Any], page_filename: str, timed: bool,
+               callback: Callable[[PageResult], None]) -> None:
+        """Process a page context in a worker, and call *callback* with the
+        result once all the pages submitted before it have been handled.
+        """
+        future = self.executor.submit(_process_page, ctx, page_filename, timed)
+        self.pending.append((future, callback))
+        while len(self.pending) > self.limit:
+            self.complete_oldest()
+
+    def complete_oldest(self) -> None:
+        future, callback = self.pending.popleft()
+        callback(future.result())
+
+    def drain(self) -> None:
+        """Handle the results of all the pages submitted."""
+        while self.pending:
+            self.complete_oldest()
+
+    def shutdown(self) -> None:
+        self.drain()
+        self.executor.shutdown()
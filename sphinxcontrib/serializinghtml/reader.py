@@ -0,0 +1,410 @@
+"""Reading the output of the serializing builders.
+
+:class:`Site` loads and caches the pages of a build for consumers such as
+web applications. :class:`PackReader` opens the packed output written with
+``html_pack`` enabled. Both files of the pack are memory-mapped, so opening
+a pack and looking up a page don't read more than the index entries and the
+page's payload.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import lzma
+import mmap
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from os import path
+from typing import TYPE_CHECKING
+
+from sphinxcontrib.serializinghtml import jsonimpl, pack
+from sphinxcontrib.serializinghtml.filenames import (
+    LAST_BUILD_FILENAME,
+    MANIFEST_FILENAME,
+    SEARCH_SHARDS_DIRNAME,
+    SHARED_DIRNAME,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from typing import Any
+
+
+class PackError(Exception):
+    """The pack is missing, damaged or inconsistent."""
+
+
+class PackReader:
+    """Read access to the pack in the output directory *outdir*.
+
+    Payloads are looked up by the name of the file they would have been
+    written to, relative to *outdir*, such as ``'guide/intro.json'`` or
+    ``'globalcontext.pickle'``.
+    """
+
+    def __init__(self, outdir: str | os.PathLike[str]) -> None:
+        self.index = self._map(path.join(outdir, pack.PACK_INDEX_FILENAME))
+        self.data = self._map(path.join(outdir, pack.PACK_DATA_FILENAME))
+        try:
+            magic, version, self.format, generation, self.count = (
+                pack.INDEX_HEADER.unpack_from(self.index))
+            data_magic, data_version, _, data_generation = (
+                pack.DATA_HEADER.unpack_from(self.data))
+        except Exception as exc:
+            self.close()
+            msg = 'truncated pack'
+            raise PackError(msg) from exc
+        if (magic, data_magic) != (pack.INDEX_MAGIC, pack.DATA_MAGIC):
+            self.close()
+            msg = 'not a pack'
+            raise PackError(msg)
+        if version != pack.VERSION or data_version != pack.VERSION:
+            self.close()
+            msg = f'unsupported pack version {version}'
+            raise PackError(msg)
+        if generation != data_generation:
+            self.close()
+            msg = 'the pack index and data are from different builds'
+            raise PackError(msg)
+        self.names_offset = pack.INDEX_HEADER.size + self.count * pack.INDEX_ENTRY.size
+
+    @staticmethod
+    def _map(filename: str) -> mmap.mmap:
+        try:
+            with open(filename, 'rb') as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as exc:
+            msg = f'cannot open {filename}: {exc}'
+            raise PackError(msg) from exc
+
+    def close(self) -> None:
+        for mapped in (getattr(self, 'index', None), getattr(self, 'data', None)):
+            if mapped is not None:
+                mapped.close()
+
+    def __enter__(self) -> PackReader:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _entry(self, position: int) -> tuple[bytes, int, int]:
+        name_offset, name_length, offset, length = pack.INDEX_ENTRY.unpack_from(
+            self.index, pack.INDEX_HEADER.size + position * pack.INDEX_ENTRY.size)
+        start = self.names_offset + name_offset
+        return self.index[start:start + name_length], offset, length
+
+    def _find(self, name: str) -> tuple[int, int] | None:
+        key = name.encode('utf-8')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry_name, offset, length = self._entry(middle)
+            if entry_name == key:
+                return offset, length
+            if entry_name < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def __contains__(self, name: str) -> bool:
+        return self._find(name) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for position in range(self.count):
+            yield self._entry(position)[0].decode('utf-8')
+
+    def payload(self, name: str) -> memoryview:
+        """Return the serialized payload of *name*, without copying it.
+
+        The view must be released before the reader is closed.
+        """
+        found = self._find(name)
+        if found is None:
+            raise KeyError(name)
+        offset, length = found
+        return memoryview(self.data)[offset:offset + length]
+
+    def load(self, name: str) -> Any:
+        """Return the deserialized payload of *name*."""
+        payload = self.payload(name)
+        try:
+            if self.format == pack.FORMAT_PICKLE:
+                return pickle.loads(payload)
+            return json.loads(bytes(payload))
+        finally:
+            payload.release()
+
+
+class Site:
+    """Loads the output of a serializing builder in *outdir*, for consumers
+    such as web applications.
+
+    Page contexts, the global context and the search index are loaded when
+    first asked for, whether the output is packed or written as files
+    (optionally precompressed), and decoded with the implementation that
+    wrote them. Decoded pages and bodies are kept in a least recently used
+    cache of about *max_memory* bytes, measured by the size of their
+    payloads.
+
+    When the ``last_build`` file changes, the next access drops only the
+    cached pages whose hash in the manifest has changed, along with the
+    global context and search index.
+    """
+
+    def __init__(self, outdir: str | os.PathLike[str], max_memory: int = 64 * 1024 * 1024,
+                 auto_refresh: bool = True) -> None:
+        self.outdir = os.fspath(outdir)
+        self.max_memory = max_memory
+        self.auto_refresh = auto_refresh
+        self.lock = threading.RLock()
+        self.pages: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self.memory = 0
+        self.pack: PackReader | None = None
+        self.hashes: dict[str, str] = {}
+        self.last_build: int | None = None
+        self._globalcontext: Any = None
+        self._searchindex: Any = None
+        self._search_manifest: Any = None
+        self._search_shards: dict[str, Any] = {}
+        # Values shared by pages in compact context mode; these are named
+        # by their content, so they never need refreshing.
+        self.shared: dict[str, Any] = {}
+        self.open()
+
+    def open(self) -> None:
+        """(Re)open the output, and read its manifest."""
+        if self.pack is not None:
+            self.pack.close()
+            self.pack = None
+        if path.isfile(path.join(self.outdir, pack.PACK_INDEX_FILENAME)):
+            self.pack = PackReader(self.outdir)
+            pickled = self.pack.format == pack.FORMAT_PICKLE
+        else:
+            globalcontext = path.join(self.outdir, 'globalcontext.json')
+            pickled = not any(path.isfile(globalcontext + suffix)
+                              for suffix in ('', '.gz', '.xz'))
+        if pickled:
+            self.loads: Callable[[bytes], Any] = pickle.loads
+            self.out_suffix = '.fpickle'
+            self.globalcontext_filename = 'globalcontext.pickle'
+            self.searchindex_filename = 'searchindex.pickle'
+        else:
+            self.loads = jsonimpl.loads
+            self.out_suffix = '.json'
+            self.globalcontext_filename = 'globalcontext.json'
+            self.searchindex_filename = 'searchindex.json'
+        self.last_build = self._last_build()
+        self.hashes = self._read_hashes()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.pack is not None:
+                self.pack.close()
+                self.pack = None
+            self.clear()
+
+    def __enter__(self) -> Site:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def clear(self) -> None:
+        """Drop all the cached pages and contexts."""
+        with self.lock:
+            self.pages.clear()
+            self.memory = 0
+            self._globalcontext = self._searchindex = None
+            self._search_manifest = None
+            self._search_shards = {}
+            self.shared = {}
+
+    def _last_build(self) -> int | None:
+        try:
+            return os.stat(path.join(self.outdir, LAST_BUILD_FILENAME)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _read_hashes(self) -> dict[str, str]:
+        try:
+            with open(path.join(self.outdir, MANIFEST_FILENAME), encoding='utf-8') as f:
+                pages = json.load(f)['pages']
+        except (OSError, ValueError, KeyError):
+            return {}
+        return {entry[key]: entry['hash'] for entry in pages.values()
+                for key in ('file', 'body') if key in entry}
+
+    def refresh(self) -> None:
+        """Drop the cached entries that the last build changed, if there has
+        been a build since the output was opened or last refreshed.
+        """
+        with self.lock:
+            if self._last_build() == self.last_build:
+                return
+            old_hashes = self.hashes
+            self.open()
+            if not old_hashes or not self.hashes:
+                self.clear()
+                return
+            for filename in list(self.pages):
+                if self.hashes.get(filename) != old_hashes.get(filename):
+                    self.memory -= self.pages.pop(filename)[1]
+            self._globalcontext = self._searchindex = None
+            self._search_manifest = None
+            self._search_shards = {}
+
+    def read(self, filename: str) -> bytes:
+        """Return the payload of the output file *filename*."""
+        if self.pack is not None:
+            try:
+                payload = self.pack.payload(filename)
+            except KeyError:
+                raise FileNotFoundError(filename) from None
+            try:
+                return bytes(payload)
+            finally:
+                payload.release()
+        fullname = path.join(self.outdir, filename)
+        for suffix, opener in (('', open), ('.gz', gzip.open), ('.xz', lzma.open)):
+            if path.isfile(fullname + suffix):
+                with opener(fullname + suffix, 'rb') as f:
+                    return f.read()
+        raise FileNotFoundError(fullname)
+
+    def _load(self, filename: str, decode: Callable[[bytes], Any]) -> Any:
+        """Return the output file *filename* decoded with *decode*, from the
+        cache if possible.
+        """
+        if self.auto_refresh:
+            self.refresh()
+        try:
+            self.pages.move_to_end(filename)
+            return self.pages[filename][0]
+        except KeyError:
+            pass
+        data = self.read(filename)
+        value = decode(data)
+        self.pages[filename] = value, len(data)
+        self.memory += len(data)
+        while self.memory > self.max_memory and len(self.pages) > 1:
+            self.memory -= self.pages.popitem(last=False)[1][1]
+        return value
+
+    def page(self, name: str) -> Any:
+        """Return the context of the page *name* (its ``current_page_name``).
+
+        If the page's body is written separately (``html_split_body``), the
+        context has the body's filename as ``body_file`` instead of the
+        body; see :meth:`body`.
+
+        Raise :exc:`KeyError` if there is no such page, or if the manifest
+        doesn't list it (the output of a page that was removed may be left
+        behind by older builds).
+        """
+        with self.lock:
+            if self.auto_refresh:
+                self.refresh()
+            filename = name + self.out_suffix
+            if self.hashes and filename not in self.hashes:
+                raise KeyError(name)
+            try:
+                return self._load(filename, self.loads)
+            except FileNotFoundError:
+                raise KeyError(name) from None
+
+    def body(self, name: str) -> str:
+        """Return the body of the page *name*."""
+        with self.lock:
+            page = self.page(name)
+            if 'body_file' not in page:
+                return page['body']
+            return self._load(page['body_file'], lambda data: data.decode('utf-8'))
+
+    def __getitem__(self, name: str) -> Any:
+        return self.page(name)
+
+    def context(self, name: str) -> dict[str, Any]:
+        """Return the full context of the page *name*.
+
+        Pages written in compact context mode (``html_compact_context``)
+        leave out the values they share with the global context and other
+        pages; the context returned has them put back.
+        """
+        with self.lock:
+            page = self.page(name)
+            if 'shared_context' not in page and 'body_file' not in page:
+                return page
+            context = dict(page)
+            if 'body_file' in context:
+                context['body'] = self.body(name)
+                del context['body_file']
+            if 'shared_context' not in page:
+                return context
+            del context['shared_context']
+            for key in context.pop('global_context', ()):
+                context[key] = self.globalcontext[key]
+            for key, shared_id in page['shared_context'].items():
+                if shared_id not in self.shared:
+                    self.shared[shared_id] = self.loads(
+                        self.read(f'{SHARED_DIRNAME}/{shared_id}{self.out_suffix}'))
+                context[key] = self.shared[shared_id]
+            return context
+
+    @property
+    def globalcontext(self) -> Any:
+        with self.lock:
+            if self.auto_refresh:
+                self.refresh()
+            if self._globalcontext is None:
+                self._globalcontext = self.loads(self.read(self.globalcontext_filename))
+            return self._globalcontext
+
+    @property
+    def searchindex(self) -> Any:
+        with self.lock:
+            if self.auto_refresh:
+                self.refresh()
+            if self._searchindex is None:
+                self._searchindex = self.loads(self.read(self.searchindex_filename))
+            return self._searchindex
+
+    @property
+    def search_manifest(self) -> Any:
+        """The manifest of the sharded search index (``html_search_shards``):
+        the search index without its terms and title terms, and the shard
+        filename for each term prefix.
+        """
+        with self.lock:
+            if self.auto_refresh:
+                self.refresh()
+            if self._search_manifest is None:
+                suffix = path.splitext(self.searchindex_filename)[1]
+                self._search_manifest = self.loads(
+                    self.read(f'{SEARCH_SHARDS_DIRNAME}/manifest{suffix}'))
+            return self._search_manifest
+
+    def search_shard(self, term: str) -> dict[str, Any]:
+        """Return the shard of the sharded search index that the stemmed
+        search term *term* would be in.
+
+        The shard's ``'terms'`` and ``'titleterms'`` map terms to documents,
+        as in the unsharded search index.
+        """
+        with self.lock:
+            manifest = self.search_manifest
+            prefix = term[:manifest['shard_prefix_length']]
+            if prefix not in self._search_shards:
+                filename = manifest['shards'].get(prefix)
+                if filename is None:
+                    return {'terms': {}, 'titleterms': {}}
+                self._search_shards[prefix] = self.loads(
+                    self.read(f'{SEARCH_SHARDS_DIRNAME}/{filename}'))
+            return self._search_shards[prefix]
@@ -0,0 +1,74 @@
+"""Writing output files in background threads.
+
+Writing pages is mostly waiting on the disk, which on network-backed or slow
+disks can take a large share of a build. :class:`BackgroundWriter` runs the
+writes in a few threads instead, so the build can carry on with the next
+pages meanwhile.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from typing import Any
+
+
+class BackgroundWriter:
+    """Runs write jobs in *threads* threads.
+
+    At most *queue_size* jobs wait to be run; beyond that, :meth:`submit`
+    blocks until a thread is free. An exception raised by a job is raised
+    again by the next call to :meth:`submit` or :meth:`flush`.
+    """
+
+    def __init__(self, threads: int, queue_size: int) -> None:
+        self.queue: queue.Queue[tuple[Callable[..., Any], tuple[Any, ...]] | None] = (
+            queue.Queue(queue_size))
+        self.errors: list[BaseException] = []
+        self.threads = [threading.Thread(target=self._run, daemon=True,
+                                         name=f'serializinghtml-writer-{number}')
+                        for number in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                func, args = job
+                func(*args)
+            except BaseException as exc:
+                self.errors.append(exc)
+            finally:
+                self.queue.task_done()
+
+    def raise_errors(self) -> None:
+        if self.errors:
+            errors, self.errors = self.errors, []
+            raise errors[0]
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> None:
+        """Run ``func(*args)`` in a writer thread."""
+        self.raise_errors()
+        self.queue.put((func, args))
+
+    def flush(self) -> None:
+        """Wait for all the jobs submitted to finish."""
+        self.queue.join()
+        self.raise_errors()
+
+    def shutdown(self) -> None:
+        """Wait for all the jobs submitted to finish, and stop the threads."""
+        try:
+            self.flush()
+        finally:
+            for _ in self.threads:
+                self.queue.put(None)
+            for thread in self.threads:
+                thread.join()
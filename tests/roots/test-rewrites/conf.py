@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+extensions = ['sphinx.ext.graphviz', 'sphinx.ext.imgmath']
+
+
+def setup(app):
+    # Linaro projects register these in their own conf.py; the builder
+    # expects them to exist.
+    app.add_config_value('html_project_name', 'test-rewrites', 'html')
+    app.add_config_value('html_link_mappings', {
+        'https://docs.example.org/onelab/': 'onelab',
+    }, 'html')
@@ -0,0 +1,8 @@
+from __future__ import annotations
+
+
+def setup(app):
+    # Linaro projects register these in their own conf.py; the builder
+    # expects them to exist.
+    app.add_config_value('html_project_name', 'test-toctree', 'html')
+    app.add_config_value('html_link_mappings', {}, 'html')
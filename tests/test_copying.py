@@ -0,0 +1,53 @@
+"""Test for copying files only when they have changed."""
+
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING
+
+import pytest
+
+from sphinxcontrib.serializinghtml import copying
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@pytest.mark.parametrize('method', copying.COPY_METHODS)
+def test_copy_if_changed(tmp_path: Path, method: str) -> None:
+    source = tmp_path / 'source'
+    dest = tmp_path / 'dest'
+    source.write_bytes(b'first')
+    assert copying.copy_if_changed(str(source), str(dest), method)
+    assert dest.read_bytes() == b'first'
+    assert not copying.copy_if_changed(str(source), str(dest), method)
+
+    # Replacing the source (as Sphinx does) is noticed, even with hard links.
+    replacement = tmp_path / 'replacement'
+    replacement.write_bytes(b'second')
+    os.replace(replacement, source)
+    assert copying.copy_if_changed(str(source), str(dest), method)
+    assert dest.read_bytes() == b'second'
+    assert sorted(tmp_path.iterdir()) == sorted([source, dest])
+
+
+def test_copy_if_changed_same_content(tmp_path: Path) -> None:
+    source = tmp_path / 'source'
+    dest = tmp_path / 'dest'
+    source.write_bytes(b'content')
+    dest.write_bytes(b'content')
+    os.utime(dest, ns=(0, 0))
+    assert not copying.copy_if_changed(str(source), str(dest), 'copy')
+    assert dest.stat().st_mtime_ns == source.stat().st_mtime_ns
+
+
+@pytest.mark.parametrize('method', ['copy', 'reflink'])
+def test_copy_if_changed_replaces_hard_link(tmp_path: Path, method: str) -> None:
+    source = tmp_path / 'source'
+    dest = tmp_path / 'dest'
+    source.write_bytes(b'content')
+    os.link(source, dest)
+    assert copying.copy_if_changed(str(source), str(dest), method)
+    assert not dest.samefile(source)
+    assert dest.read_bytes() == b'content'
+    assert not copying.copy_if_changed(str(source), str(dest), method)
@@ -0,0 +1,214 @@
+"""Test for the html_assists body transforms."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+from bs4 import BeautifulSoup
+
+from sphinxcontrib.serializinghtml import html_assists
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+LINK_MAPPINGS = {
+    'https://docs.example.org/onelab/': 'onelab',
+}
+
+# Bodies and a toctree written by Sphinx, and hand-written edge cases, with
+# the output the Next.js front end expects from them in expected/.
+CORPUS = Path(__file__).resolve().parent / 'html-corpus'
+CORPUS_LINK_MAPPINGS = {
+    'https://docs.example.org/onelab/': 'onelab',
+    'https://docs.example.org/': 'docs',
+}
+CORPUS_BODIES = sorted(path.name for path in CORPUS.glob('*.html')
+                       if path.name != 'toctree.html')
+
+PARSERS = [pytest.param(name, marks=pytest.mark.skipif(
+    not html_assists.parser_available(name), reason=f'{name} is not installed'))
+    for name in html_assists.PARSERS]
+
+BODIES = [
+    '<p>No markup that needs rewriting.</p>\n',
+    '<img alt="a &amp;lt; b" src="x.png"/>\n<p>text</p>\n',
+    '<div class="highlight"><pre><span></span><span class="n">a</span>'
+    '<span class="o">&lt;</span><span class="n">b</span>\n</pre></div>\n',
+    '<p><code class="docutils literal notranslate"><span class="pre">x&amp;y</span>'
+    '</code></p>\n',
+    '<p><a class="reference external" href="https://docs.example.org/onelab/index.html">'
+    'OneLab</a> and <a class="reference internal" href="guide/other">other</a></p>\n',
+    '<img alt="&lt;tag&gt;" src="y.png"/><pre><span class="s">&quot;&amp;&quot;</span></pre>'
+    '<a href="#anchor">a</a><br>\n',
+    # markers in other cases and quoting styles
+    '<IMG alt="&lt;b&gt;" src="z.png">\n',
+    '<PRE><span>&lt;x&gt;</span></PRE>\n',
+    '<p><A href="https://docs.example.org/onelab/a.html">A</A></p>\n',
+    "<p><code><span class='pre'>a&amp;b</span></code></p>\n",
+    '<p><code><span class="pre x">a&amp;b</span></code></p>\n',
+]
+
+
+# Markup that lxml repairs, where html.parser keeps it as it is.
+MALFORMED = [
+    '<ul><li>one<li>two</ul>',
+    '<p>x<div>y</div></p>',
+    '<a href="a">x<a href="b">y</a></a>',
+    '<select><option>a<option>b</select>',
+    '<p>a<p>b</p></p>',
+    '<p><hr></p>',
+    '<p><TABLE><tr><td>x</td></tr></TABLE></p>',
+    '<p>a</p></br>',
+    '<ul><li>t</li><pre>x</pre></ul>',
+    '<h2>t<p>x</p></h2>',
+    '<dl><li>x</li></dl>',
+    '<iframe><img alt="a&amp;lt;b"></iframe>',
+    '<p>a<wbr>b</p>',
+    '<span>t<th>x</th></span>',
+]
+
+
+def chained(html: str, page_filename: str,
+            link_mappings: dict[str, str] = LINK_MAPPINGS) -> str:
+    html = html_assists.escape_encoded_alt_text(html)
+    html = html_assists.escape_encoded_pre_text(html)
+    return html_assists.rewrite_hub_links(html, link_mappings, page_filename)
+
+
+@pytest.mark.parametrize('body', BODIES)
+@pytest.mark.parametrize('page_filename', ['index', 'guide/intro'])
+def test_postprocess_body_matches_chain(body: str, page_filename: str) -> None:
+    result = html_assists.postprocess_body(
+        body, link_mappings=LINK_MAPPINGS, page_filename=page_filename)
+    assert result == chained(body, page_filename)
+
+
+def test_postprocess_body_stray_end_tag_whitespace() -> None:
+    # The stray </ul> splits the whitespace before <table> into two
+    # strings. The chain re-parses the body after the alt text is escaped,
+    # which merges them into one and collapses it to a newline; a single
+    # parse keeps both.
+    body = '<img alt="&amp;lt;"/><a href="x">u</a> </ul>\n<table></table>'
+    result = html_assists.postprocess_body(
+        body, link_mappings=LINK_MAPPINGS, page_filename='guide/intro')
+    assert result == '<img alt="&amp;amp;amp;lt;"/><a href="../x">u</a> \n<table></table>'
+    assert chained(body, 'guide/intro') == (
+        '<img alt="&amp;amp;amp;lt;"/><a href="../x">u</a>\n<table></table>')
+
+
+def test_postprocess_body_skips_parse() -> None:
+    body = '<p>Plain &amp; simple</p>'
+    assert html_assists.postprocess_body(body, link_mappings={}, page_filename='x') is body
+
+
+def test_link_rewriter_longest_prefix() -> None:
+    rewriter = html_assists.LinkRewriter({
+        'https://docs.example.org/': 'docs',
+        'https://docs.example.org/onelab/': 'onelab',
+    })
+    assert rewriter.longest_prefix('https://example.org/') is None
+    assert rewriter.map_href('https://docs.example.org/onelab/guide/start.html') == (
+        '/library/onelab/guide/start')
+    assert rewriter.map_href('https://docs.example.org/laa/index.html') == '/library/docs/laa'
+    assert rewriter.rewrite('guide/start', 'guide/intro') == 'start'
+    assert rewriter.rewrite('guide/', 'guide/intro') == ''
+    assert rewriter.rewrite('#anchor', 'guide/intro') == '#anchor'
+
+
+@pytest.fixture(params=PARSERS)
+def parser(request: pytest.FixtureRequest) -> Iterator[str]:
+    assert html_assists.use_parser(request.param) == request.param
+    yield request.param
+    html_assists.use_parser('html.parser')
+
+
+@pytest.mark.parametrize('name', CORPUS_BODIES)
+def test_corpus_postprocess_body(parser: str, name: str) -> None:
+    body = (CORPUS / name).read_text(encoding='utf-8')
+    result = html_assists.postprocess_body(
+        body, link_mappings=CORPUS_LINK_MAPPINGS, page_filename='guide/intro')
+    assert result == (CORPUS / 'expected' / name).read_text(encoding='utf-8')
+    assert chained(body, 'guide/intro', CORPUS_LINK_MAPPINGS) == result
+
+
+@pytest.mark.parametrize('line', (CORPUS / 'malformed.html').read_text(
+    encoding='utf-8').splitlines())
+def test_corpus_malformed_line(parser: str, line: str) -> None:
+    # Each line of malformed.html has markup of its own that lxml repairs,
+    # which the body as a whole doesn't show once one line falls back.
+    result = html_assists.postprocess_body(
+        line, link_mappings=CORPUS_LINK_MAPPINGS, page_filename='guide/intro')
+    html_assists.use_parser('html.parser')
+    assert result == html_assists.postprocess_body(
+        line, link_mappings=CORPUS_LINK_MAPPINGS, page_filename='guide/intro')
+
+
+@pytest.mark.parametrize('name', CORPUS_BODIES)
+@pytest.mark.parametrize('chunk_size', [1, 200, 1024 * 1024])
+def test_corpus_postprocess_body_chunks(parser: str, name: str, chunk_size: int) -> None:
+    body = (CORPUS / name).read_text(encoding='utf-8')
+    pieces = html_assists.postprocess_body_chunks(
+        body, chunk_size, link_mappings=CORPUS_LINK_MAPPINGS, page_filename='guide/intro')
+    result = body if pieces is None else ''.join(pieces)
+    assert result == (CORPUS / 'expected' / name).read_text(encoding='utf-8')
+
+
+def test_body_scanner() -> None:
+    body = '<section><p>a</p><div><p>b</p><p>c</p></div><p>d</p></section><p>e</p>'
+    segments = html_assists.BodyScanner(body, 8).scan()
+    assert segments is not None
+    section = segments[0]
+    assert isinstance(section, html_assists.BodySegment)
+    assert body[section.start:section.content_start] == '<section>'
+    assert segments[1:] == [(body.index('<p>e</p>'), len(body))]
+    # tags that html.parser would have to repair aren't split
+    assert html_assists.BodyScanner('<div><p>a</div></p>', 1).scan() is None
+    assert html_assists.BodyScanner('<div><p>a</p>', 1).scan() is None
+
+
+@pytest.mark.skipif(not html_assists.parser_available('lxml'), reason='lxml is not installed')
+def test_lxml_parses_alike_tag_pairs() -> None:
+    # Every element in every other, as far as lxml_parses_alike() lets lxml
+    # parse it.
+    tags = sorted(html_assists.LXML_CLOSED_BY.keys()
+                  | set().union(*html_assists.LXML_CLOSED_BY.values())
+                  | html_assists.VOID_ELEMENTS
+                  | {'code', 'custom-el', 'div', 'em', 'iframe', 'noembed', 'noframes',
+                     'plaintext', 'section', 'select', 'strong', 'textarea', 'title', 'xmp'})
+    html_assists.use_parser('lxml')
+    try:
+        for parent in sorted(set(tags) - html_assists.VOID_ELEMENTS):
+            for child in tags:
+                inner = (f'<{child}>' if child in html_assists.VOID_ELEMENTS
+                         else f'<{child}>x</{child}>')
+                html = f'<{parent}>t{inner}y</{parent}>'
+                if html_assists.lxml_parses_alike(html):
+                    result = html_assists.serialize_html(html_assists.parse_html(html))
+                    assert result == str(BeautifulSoup(html, 'html.parser')), html
+    finally:
+        html_assists.use_parser('html.parser')
+
+
+@pytest.mark.parametrize('html', MALFORMED)
+def test_parse_malformed(parser: str, html: str) -> None:
+    expected = str(BeautifulSoup(html, 'html.parser'))
+    assert html_assists.serialize_html(html_assists.parse_html(html)) == expected
+    assert not html_assists.lxml_parses_alike(html)
+
+
+def test_corpus_toctree(parser: str) -> None:
+    html = (CORPUS / 'toctree.html').read_text(encoding='utf-8')
+    expected = json.loads((CORPUS / 'expected' / 'toctree.json').read_text(encoding='utf-8'))
+    assert html_assists.convert_nav_html_to_json(html) == expected
+
+
+def test_use_parser() -> None:
+    try:
+        assert html_assists.use_parser('missing') == 'html.parser'
+        expected = 'lxml' if html_assists.parser_available('lxml') else 'html.parser'
+        assert html_assists.use_parser('auto') == expected
+    finally:
+        html_assists.use_parser('html.parser')
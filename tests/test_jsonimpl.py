@@ -0,0 +1,54 @@
+"""Test for the jsonimpl backends."""
+
+from __future__ import annotations
+
+import json
+from collections import UserString
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+from sphinxcontrib.serializinghtml import jsonimpl
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+DATA = {
+    'title': UserString('Proxy'),
+    'body': '<p>café   \U0001f600 &amp; "quotes"</p>',
+    'parents': [{'link': '../', 'title': UserString('Parent')}],
+    'numbers': (1, -0.0, 1e100, 0.1, 10 ** 30, float('nan')),
+    'flags': [True, False, None],
+    'empty': {},
+}
+
+
+@pytest.fixture(params=sorted(jsonimpl.BACKENDS))
+def backend(request: pytest.FixtureRequest) -> Iterator[str]:
+    yield jsonimpl.use_backend(request.param)
+    jsonimpl.use_backend('json')
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'ensure_ascii': False},
+                                    {'separators': (',', ':'), 'sort_keys': True}])
+def test_backend_output(backend: str, kwargs: dict[str, Any]) -> None:
+    expected = json.dumps(DATA, cls=jsonimpl.SphinxJSONEncoder, **kwargs)
+    assert jsonimpl.dumps(DATA, **kwargs) == expected
+
+
+def test_normalize_shares_unchanged() -> None:
+    unchanged = {'list': [1, 'a'], 'dict': {'b': 2}}
+    assert jsonimpl.normalize(unchanged) is unchanged
+    normalized = jsonimpl.normalize(DATA)
+    assert normalized['title'] == 'Proxy'
+    assert type(normalized['title']) is str
+    assert normalized['numbers'] is DATA['numbers']
+    assert DATA['title'] == UserString('Proxy')
+
+
+def test_use_backend_fallback() -> None:
+    try:
+        assert jsonimpl.use_backend('no-such-backend') == 'json'
+        assert jsonimpl.use_backend('auto') in jsonimpl.BACKENDS
+    finally:
+        jsonimpl.use_backend('json')
@@ -2,12 +2,55 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import pickle
+import shutil
+import threading
+import tracemalloc
+from pathlib import PurePosixPath
+from typing import TYPE_CHECKING, Any
 
 import pytest
+from bs4 import BeautifulSoup
+from sphinx.ext import graphviz, imgmath
+
+from sphinxcontrib.serializinghtml import (
+    JSONHTMLBuilder,
+    SerializingHTMLBuilder,
+    html_assists,
+    reader,
+)
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+    from io import StringIO
+    from pathlib import Path
+
     from sphinx.application import Sphinx
+    from sphinx.testing.util import SphinxTestApp
+
+
+def serializing_builder(app: Sphinx) -> SerializingHTMLBuilder:
+    assert isinstance(app.builder, SerializingHTMLBuilder)
+    return app.builder
+
+
+def load_bodies(app: Sphinx) -> dict[str, str]:
+    bodies = {}
+    builder = serializing_builder(app)
+    for docname in app.env.found_docs:
+        outfile = app.outdir / (builder.get_page_filename(docname) + '.json')
+        with open(outfile, encoding='utf-8') as f:
+            bodies[docname] = json.load(f)['body']
+    return bodies
+
+
+def normalize(html: str) -> str:
+    return str(BeautifulSoup(html, 'html.parser'))
 
 
 @pytest.mark.sphinx('json', testroot='basic')
@@ -18,3 +61,602 @@ def test_json(app: Sphinx) -> None:
 @pytest.mark.sphinx('pickle', testroot='basic')
 def test_pickle(app: Sphinx) -> None:
     app.builder.build_all()
+
+
+@pytest.mark.sphinx('json', testroot='rewrites')
+def test_translator_rewrites_parity(app: Sphinx, make_app: Callable[..., SphinxTestApp],
+                                    monkeypatch: pytest.MonkeyPatch,
+                                    tmp_path: Path) -> None:
+    # graphviz and imgmath write their <img> tags themselves; render them
+    # without dot and LaTeX.
+    outfn = tmp_path / 'graphviz.png'
+    outfn.with_name('graphviz.png.map').write_text('<map id="%3" name="%3">\n</map>\n',
+                                                     encoding='utf-8')
+    monkeypatch.setattr(graphviz, 'render_dot', lambda *args, **kwargs: (
+        PurePosixPath('_images/graphviz.png'), str(outfn)))
+    monkeypatch.setattr(imgmath, 'render_math', lambda *args, **kwargs: (
+        str(tmp_path / 'math.png'), None))
+
+    app.build(force_all=True)
+    expected = load_bodies(app)
+    assert 'alt="a &amp;amp;lt; b &amp;amp;amp; c"' in expected['guide/intro']
+
+    rewrites_app = make_app('json', srcdir=app.srcdir, builddir=app.srcdir / '_build_rw',
+                            confoverrides={'html_translator_rewrites': True})
+    rewrites_app.build(force_all=True)
+    bodies = load_bodies(rewrites_app)
+
+    # The post-parse path serializes the bodies it edits with BeautifulSoup.
+    assert bodies.keys() == expected.keys()
+    for docname, body in bodies.items():
+        assert expected[docname] in (body, normalize(body)), docname
+
+
+@pytest.mark.sphinx('json', testroot='toctree')
+def test_toctree_json(app: Sphinx) -> None:
+    app.build(force_all=True)
+
+    builder = serializing_builder(app)
+    shared = set()
+    for docname in app.env.found_docs:
+        outfile = app.outdir / (builder.get_page_filename(docname) + '.json')
+        with open(outfile, encoding='utf-8') as f:
+            toctree = json.load(f)['toctree']
+        rendered = builder._get_local_toctree(docname, includehidden=True)
+        assert toctree == html_assists.convert_nav_html_to_json(rendered), docname
+        if builder.get_toctree_cache_key(docname) is not None:
+            shared.add(docname)
+
+    assert shared == {'user/topics/alpha', 'user/topics/beta', 'user/topics/gamma',
+                      'api/server/detail'}
+
+
+@pytest.mark.sphinx('json', testroot='rewrites', confoverrides={
+    'html_instrumentation': True,
+    'html_instrumentation_report': 'timings.json',
+    'html_body_cache_size': 0,
+})
+def test_instrumentation_report(app: Sphinx) -> None:
+    timings = {}
+    app.connect('serializinghtml-page-timings',
+                lambda app, pagename, record: timings.update({pagename: record}))
+    app.build(force_all=True)
+
+    assert {'index', 'guide/index', 'guide/intro'} <= timings.keys()
+    record = timings['guide/intro']
+    assert {'toctree', 'serialize', 'write', 'body:parse'} <= record['timings'].keys()
+    assert record['sizes']['output'] == (app.outdir / 'guide/intro.json').stat().st_size
+
+    report = json.loads((app.outdir / 'timings.json').read_text(encoding='utf-8'))
+    assert report['pages'] == len(timings)
+    assert report['sizes']['output'] == sum(record['sizes']['output']
+                                            for record in timings.values())
+    assert report['slowest'][0]['total'] == report['total']['max']
+
+
+@pytest.mark.sphinx('json', testroot='toctree', srcdir='parallel-timings', parallel=2,
+                    confoverrides={'html_instrumentation': True})
+def test_instrumentation_parallel(app: Sphinx) -> None:
+    timings: dict[str, dict[str, Any]] = {}
+    app.connect('serializinghtml-page-timings',
+                lambda app, pagename, record: timings.update({pagename: record}))
+    app.build(force_all=True)
+    # Most pages are written by forked processes; their timings are
+    # reported in this process once the pages are collected.
+    assert set(app.env.found_docs) <= timings.keys()
+
+
+@pytest.mark.sphinx('json', testroot='rewrites', srcdir='manifest')
+def test_manifest_changes(app: Sphinx, make_app: Callable[..., SphinxTestApp]) -> None:
+    def load(filename: str) -> dict[str, Any]:
+        return json.loads((app.outdir / filename).read_text(encoding='utf-8'))
+
+    def rebuild(**kwargs: Any) -> None:
+        make_app('json', srcdir=app.srcdir).build(**kwargs)
+
+    app.build(force_all=True)
+    manifest = load('_manifest.json')['pages']
+    assert manifest['guide/intro']['file'] == 'guide/intro.json'
+    assert 'guide/intro.json' in load('_changes.json')['added']
+    intro = app.outdir / 'guide/intro.json'
+    inode = intro.stat().st_ino
+
+    # Nothing changed, so nothing is rewritten.
+    rebuild(force_all=True)
+    assert load('_changes.json') == {'added': [], 'modified': [], 'removed': []}
+    assert load('_manifest.json')['pages'] == manifest
+    # (files are written by replacing them)
+    assert intro.stat().st_ino == inode
+
+    (app.srcdir / 'guide/intro.rst').write_text(
+        (app.srcdir / 'guide/intro.rst').read_text(encoding='utf-8') + '\nMore text.\n',
+        encoding='utf-8')
+    rebuild()
+    changes = load('_changes.json')
+    assert 'guide/intro.json' in changes['modified']
+    assert changes['added'] == changes['removed'] == []
+    assert 'More text.' in json.loads(intro.read_text(encoding='utf-8'))['body']
+    # Pages that weren't rewritten stay in the manifest.
+    assert load('_manifest.json')['pages'].keys() == manifest.keys()
+
+    (app.srcdir / 'guide/intro.rst').unlink()
+    rebuild()
+    assert load('_changes.json')['removed'] == ['guide/intro.json']
+    assert 'guide/intro' not in load('_manifest.json')['pages']
+    assert not intro.exists()
+
+
+@pytest.mark.sphinx('json', testroot='rewrites', srcdir='manifest-touch', confoverrides={
+    'html_precompress': ['gz'],
+})
+def test_unchanged_page_not_rebuilt(app: Sphinx,
+                                    make_app: Callable[..., SphinxTestApp]) -> None:
+    app.build(force_all=True)
+    # The source is newer than the output, but renders the same.
+    (app.srcdir / 'guide/intro.rst').touch()
+    written: list[str] = []
+    for _ in range(3):
+        new_app = make_app('json', srcdir=app.srcdir)
+        new_app.connect('html-page-context',
+                        lambda app, pagename, *args: written.append(pagename))
+        new_app.build()
+    assert written.count('guide/intro') == 1
+    assert written.count('index') == 0
+
+    (app.srcdir / 'guide/intro.rst').unlink()
+    make_app('json', srcdir=app.srcdir).build()
+    assert not (app.outdir / 'guide/intro.json').exists()
+    assert not (app.outdir / 'guide/intro.json.gz').exists()
+
+
+@pytest.mark.sphinx('json', testroot='rewrites', srcdir='bodycache')
+def test_body_cache(app: Sphinx, make_app: Callable[..., SphinxTestApp],
+                    monkeypatch: pytest.MonkeyPatch) -> None:
+    app.build(force_all=True)
+    expected = load_bodies(app)
+    cache = serializing_builder(app).body_cache
+    assert cache is not None
+    entries = set(cache.entries())
+    assert len(entries) == len(expected)
+
+    # Bodies come from the cache, and so do not need to be parsed again.
+    parsed: list[str] = []
+
+    def postprocess_body(html: str, **kwargs: Any) -> str:
+        parsed.append(html)
+        return html
+
+    monkeypatch.setattr(html_assists, 'postprocess_body', postprocess_body)
+    cached_app = make_app('json', srcdir=app.srcdir)
+    cached_app.build(force_all=True)
+    monkeypatch.undo()
+    assert parsed == []
+    assert load_bodies(cached_app) == expected
+
+    # Different link mappings invalidate the cache.
+    remapped_app = make_app('json', srcdir=app.srcdir, confoverrides={
+        'html_link_mappings': {'https://docs.example.org/': 'docs'}})
+    remapped_cache = serializing_builder(remapped_app).body_cache
+    assert remapped_cache is not None
+    assert remapped_cache.entries() == []
+
+    cache.max_size = 0
+    cache.evict()
+    assert cache.entries() == []
+
+
+@pytest.mark.sphinx('json', testroot='rewrites', srcdir='precompress', confoverrides={
+    'html_precompress': ['gz', 'xz'],
+    'html_precompress_originals': False,
+})
+def test_precompress(app: Sphinx, make_app: Callable[..., SphinxTestApp]) -> None:
+    app.build(force_all=True)
+    intro = app.outdir / 'guide/intro.json'
+    assert not intro.exists()
+    # The compressed copies keep the pages from being seen as outdated.
+    assert list(serializing_builder(app).get_outdated_docs()) == []
+    data = gzip.decompress((app.outdir / 'guide/intro.json.gz').read_bytes())
+    assert lzma.decompress((app.outdir / 'guide/intro.json.xz').read_bytes()) == data
+    assert json.loads(data)['current_page_name'] == 'guide/intro'
+    searchindex = app.outdir / 'searchindex.json'
+    assert gzip.decompress((app.outdir / 'searchindex.json.gz').read_bytes()) == (
+        searchindex.read_bytes())
+
+    # Changing the settings rewrites the pages, even though they haven't changed.
+    make_app('json', srcdir=app.srcdir, confoverrides={'html_precompress': ['gz']}).build()
+    assert intro.read_bytes() == data
+    assert (app.outdir / 'guide/intro.json.gz').exists()
+    assert not (app.outdir / 'guide/intro.json.xz').exists()
+
+
+@pytest.mark.sphinx('json', testroot='rewrites', srcdir='json_backend',
+                    confoverrides={'html_json_backend': 'json'})
+def test_json_backend_parity(app: Sphinx, make_app: Callable[..., SphinxTestApp]) -> None:
+    pytest.importorskip('simplejson')
+    app.build(force_all=True)
+    expected = {p: p.read_bytes() for p in app.outdir.rglob('*.json')}
+
+    fast_app = make_app('json', srcdir=app.srcdir, builddir=app.srcdir / '_build_fast',
+                        confoverrides={'html_json_backend': 'simplejson'})
+    fast_app.build(force_all=True)
+    assert isinstance(fast_app.builder, JSONHTMLBuilder)
+    assert fast_app.builder.json_backend == 'simplejson'
+    for filename, data in expected.items():
+        assert (fast_app.outdir / filename.relative_to(app.outdir)).read_bytes() == data
+
+
+@pytest.mark.sphinx('json', testroot='rewrites', srcdir='parser_backend',
+                    confoverrides={'html_body_cache_size': 0})
+def test_parser_backend_parity(app: Sphinx,
+                               make_app: Callable[..., SphinxTestApp]) -> None:
+    pytest.importorskip('lxml')
+    app.build(force_all=True)
+    expected = {p: p.read_bytes() for p in app.outdir.rglob('*.json')}
+
+    lxml_app = make_app('json', srcdir=app.srcdir, builddir=app.srcdir / '_build_lxml',
+                        confoverrides={'html_body_cache_size': 0,
+                                       'html_parser_backend': 'lxml'})
+    lxml_app.build(force_all=True)
+    assert serializing_builder(lxml_app).parser_backend == 'lxml'
+    for filename, data in expected.items():
+        assert (lxml_app.outdir / filename.relative_to(app.outdir)).read_bytes() == data
+
+
+@pytest.mark.parametrize('builder', ['json', 'pickle', 'ndjson'])
+@pytest.mark.parametrize('split_body', [False, True])
+def test_large_bodies(builder: str, split_body: bool,
+                      make_app: Callable[..., SphinxTestApp], rootdir: Path,
+                      sphinx_test_tempdir: Path) -> None:
+    srcdir = sphinx_test_tempdir / f'large-bodies-{builder}-{split_body}'
+    if not srcdir.exists():
+        shutil.copytree(rootdir / 'test-rewrites', srcdir)
+    confoverrides = {'html_body_cache_size': 0, 'html_split_body': split_body}
+    app = make_app(builder, srcdir=srcdir, confoverrides=confoverrides)
+    app.build(force_all=True)
+    skipped = {'last_build', 'environment.pickle', 'timings.json'}
+    expected = {p.relative_to(app.outdir): p.read_bytes() for p in app.outdir.rglob('*')
+                if p.is_file() and p.name not in skipped}
+
+    large_app = make_app(builder, srcdir=srcdir, builddir=srcdir / '_build_large',
+                         confoverrides={**confoverrides,
+                                        'html_large_body_threshold': 1,
+                                        'html_large_body_chunk_size': 64,
+                                        'html_instrumentation': True,
+                                        'html_instrumentation_memory': True,
+                                        'html_instrumentation_report': 'timings.json'})
+    timings: dict[str, Any] = {}
+    large_app.connect('serializinghtml-page-timings',
+                      lambda app, pagename, record: timings.update({pagename: record}))
+    large_app.build(force_all=True)
+    written = {p.relative_to(large_app.outdir): p.read_bytes()
+               for p in large_app.outdir.rglob('*')
+               if p.is_file() and p.name not in skipped}
+    assert written == expected
+    assert all(record['sizes']['peak_memory'] > 0 for record in timings.values())
+    report = json.loads((large_app.outdir / 'timings.json').read_text(encoding='utf-8'))
+    assert 'peak_memory' not in report['sizes']
+    assert report['peaks']['peak_memory']['max'] == max(
+        record['sizes']['peak_memory'] for record in timings.values())
+    assert not tracemalloc.is_tracing()
+
+
+@pytest.mark.sphinx('json', testroot='toctree', srcdir='pool', confoverrides={
+    'html_body_cache_size': 0,
+})
+def test_pool_matches_serial(app: Sphinx, make_app: Callable[..., SphinxTestApp]) -> None:
+    app.build(force_all=True)
+    expected = {p.relative_to(app.outdir): p.read_bytes() for p in app.outdir.rglob('*.json')}
+
+    pool_app = make_app('json', srcdir=app.srcdir, builddir=app.srcdir / '_build_pool',
+                        confoverrides={'html_body_cache_size': 0, 'html_pool_size': 2,
+                                       'html_instrumentation': True})
+    timings: list[str] = []
+    pool_app.connect('serializinghtml-page-timings',
+                     lambda app, pagename, record: timings.append(pagename))
+    pool_app.build(force_all=True)
+    assert serializing_builder(pool_app).page_pool is None
+    written = {p.relative_to(pool_app.outdir): p.read_bytes()
+               for p in pool_app.outdir.rglob('*.json')}
+    assert written == expected
+    assert set(timings) >= set(app.env.found_docs)
+
+
+@pytest.mark.sphinx('json', testroot='toctree', srcdir='pool-threads', confoverrides={
+    'html_pool_size': 2, 'html_writer_threads': 3,
+})
+def test_pool_forks_before_writer_threads(app: Sphinx,
+                                          monkeypatch: pytest.MonkeyPatch) -> None:
+    fork = os.fork
+    events: list[str] = []
+    threads: list[int] = []
+
+    def record_fork() -> int:
+        events.append('fork')
+        threads.append(threading.active_count())
+        return fork()
+
+    monkeypatch.setattr(os, 'fork', record_fork)
+    app.connect('html-page-context', lambda *args: events.append('page'))
+    app.build(force_all=True)
+    # The workers are forked up front, before any page starts the writers.
+    assert events[:3] == ['fork', 'fork', 'page']
+    assert threads == [1, 1]
+
+
+@pytest.mark.parametrize('builder', ['json', 'pickle'])
+def test_pack(builder: str, make_app: Callable[..., SphinxTestApp], rootdir: Path,
+              sphinx_test_tempdir: Path) -> None:
+    srcdir = sphinx_test_tempdir / f'pack-{builder}'
+    if not srcdir.exists():
+        shutil.copytree(rootdir / 'test-rewrites', srcdir)
+    app = make_app(builder, srcdir=srcdir)
+    app.build(force_all=True)
+    plain = serializing_builder(app)
+    packed = {plain.globalcontext_filename, plain.searchindex_filename}
+    expected = {p.relative_to(app.outdir).as_posix(): p.read_bytes()
+                for p in app.outdir.rglob('*')
+                if p.suffix == plain.out_suffix and not p.name.startswith('_')
+                or p.name in packed}
+
+    pack_app = make_app(builder, srcdir=srcdir, builddir=srcdir / '_build_pack',
+                        confoverrides={'html_pack': True})
+    pack_app.build(force_all=True)
+    # Only the search index is kept, for incremental builds.
+    assert {p.name for p in pack_app.outdir.rglob('*' + plain.out_suffix)
+            if not p.name.startswith('_')} <= {plain.searchindex_filename}
+    # The pages kept in the page root keep them from being seen as outdated.
+    assert list(serializing_builder(pack_app).get_outdated_docs()) == []
+
+    with reader.PackReader(pack_app.outdir) as pack:
+        assert set(pack) == set(expected)
+        for name, data in expected.items():
+            payload = pack.payload(name)
+            assert payload == data, name
+            payload.release()
+        context = pack.load(plain.globalcontext_filename)
+        assert context['project'] == app.config.project
+        assert 'guide/intro' in pack.load(plain.searchindex_filename)['docnames']
+
+
+@pytest.mark.sphinx('json', testroot='rewrites', srcdir='site')
+def test_site(app: Sphinx, make_app: Callable[..., SphinxTestApp]) -> None:
+    app.build(force_all=True)
+    site = reader.Site(app.outdir)
+    intro = site['guide/intro']
+    assert intro['current_page_name'] == 'guide/intro'
+    guide = site.page('guide')
+    assert site.page('guide') is guide
+    assert site.globalcontext['project'] == app.config.project
+    assert 'guide/intro' in site.searchindex['docnames']
+    with pytest.raises(KeyError):
+        site.page('no/such/page')
+
+    (app.srcdir / 'guide/intro.rst').write_text(
+        (app.srcdir / 'guide/intro.rst').read_text(encoding='utf-8') + '\nMore text.\n',
+        encoding='utf-8')
+    make_app('json', srcdir=app.srcdir).build()
+    # Only the page that changed is loaded again.
+    assert 'More text.' in site['guide/intro']['body']
+    assert site.page('guide') is guide
+
+    small = reader.Site(app.outdir, max_memory=1)
+    small.page('guide')
+    small.page('guide/intro')
+    assert list(small.pages) == ['guide/intro.json']
+
+    # Pages the manifest doesn't list aren't served, even if their files
+    # have been left behind.
+    leftover = (app.outdir / 'guide/intro.json').read_bytes()
+    (app.srcdir / 'guide/intro.rst').unlink()
+    make_app('json', srcdir=app.srcdir).build()
+    (app.outdir / 'guide/intro.json').write_bytes(leftover)
+    with pytest.raises(KeyError):
+        site.page('guide/intro')
+
+
+@pytest.mark.sphinx('pickle', testroot='rewrites', srcdir='site-pack',
+                    confoverrides={'html_pack': True})
+def test_site_pack(app: Sphinx) -> None:
+    app.build(force_all=True)
+    with reader.Site(app.outdir) as site:
+        assert site.pack is not None
+        assert site['guide/intro']['current_page_name'] == 'guide/intro'
+        assert site.globalcontext['project'] == app.config.project
+
+
+@pytest.mark.sphinx('json', testroot='toctree', srcdir='search-shards',
+                    confoverrides={'html_search_shards': True})
+def test_search_shards(app: Sphinx) -> None:
+    app.build(force_all=True)
+    searchindex = json.loads((app.outdir / 'searchindex.json').read_text(encoding='utf-8'))
+    shards = sorted((app.outdir / '_searchindex').glob('*.json'))
+    assert len(shards) > 2
+
+    site = reader.Site(app.outdir)
+    manifest = site.search_manifest
+    assert manifest['docnames'] == searchindex['docnames']
+    assert 'terms' not in manifest
+    assert len(shards) == len(manifest['shards']) + 1
+    for key in ('terms', 'titleterms'):
+        for term, value in searchindex[key].items():
+            assert site.search_shard(term)[key][term] == value
+    assert site.search_shard('zzzz') == {'terms': {}, 'titleterms': {}}
+
+
+@pytest.mark.sphinx('json', testroot='toctree', srcdir='compact')
+def test_compact_context(app: Sphinx, make_app: Callable[..., SphinxTestApp]) -> None:
+    app.build(force_all=True)
+    compact_app = make_app('json', srcdir=app.srcdir, builddir=app.srcdir / '_build_compact',
+                           confoverrides={'html_compact_context': True})
+    compact_app.build(force_all=True)
+
+    def size(outdir: Path) -> int:
+        return sum(p.stat().st_size for p in outdir.rglob('*.json')
+                   if p.name not in {'_manifest.json', '_changes.json'})
+
+    assert size(compact_app.outdir) < size(app.outdir)
+    full = reader.Site(app.outdir)
+    compact = reader.Site(compact_app.outdir)
+    for docname in app.env.found_docs:
+        name = serializing_builder(app).get_page_filename(docname)
+        assert 'toctree' not in compact.page(name)
+        assert compact.context(name) == full.page(name), name
+    # Pages in the same section share their toctree.
+    assert (compact.page('user/topics/alpha')['shared_context']['toctree']
+            == compact.page('user/topics/beta')['shared_context']['toctree'])
+
+
+@pytest.mark.sphinx('pickle', testroot='rewrites', srcdir='split-body')
+def test_split_body(app: Sphinx, make_app: Callable[..., SphinxTestApp]) -> None:
+    app.build(force_all=True)
+    split_app = make_app('pickle', srcdir=app.srcdir, builddir=app.srcdir / '_build_split',
+                         confoverrides={'html_split_body': True})
+    split_app.build(force_all=True)
+
+    full = reader.Site(app.outdir)
+    split = reader.Site(split_app.outdir)
+    intro = split.page('guide/intro')
+    assert 'body' not in intro
+    assert intro['body_file'] == 'guide/intro.body'
+    assert (split_app.outdir / 'guide/intro.body').read_bytes() == (
+        full.page('guide/intro')['body'].encode('utf-8'))
+    for docname in app.env.found_docs:
+        name = serializing_builder(app).get_page_filename(docname)
+        assert split.body(name) == full.body(name)
+        assert split.context(name) == full.page(name)
+
+
+@pytest.mark.sphinx('json', testroot='toctree', srcdir='writer')
+def test_writer_threads(app: Sphinx, make_app: Callable[..., SphinxTestApp]) -> None:
+    app.build(force_all=True)
+    expected = {p.relative_to(app.outdir): p.read_bytes() for p in app.outdir.rglob('*')
+                if p.is_file() and p.name != 'last_build'}
+
+    threaded_app = make_app('json', srcdir=app.srcdir, builddir=app.srcdir / '_build_threads',
+                            confoverrides={'html_writer_threads': 3})
+    threaded_app.build(force_all=True)
+    assert serializing_builder(threaded_app).writer is None
+    written = {p.relative_to(threaded_app.outdir): p.read_bytes()
+               for p in threaded_app.outdir.rglob('*')
+               if p.is_file() and p.name != 'last_build'}
+    assert written.keys() == expected.keys()
+    for filename, data in expected.items():
+        if filename.suffix != '.pickle':
+            assert written[filename] == data, filename
+
+
+@pytest.mark.sphinx('json', testroot='rewrites', srcdir='copies', confoverrides={
+    'html_env_export': ['all_docs', 'titles', 'no_such_attribute'],
+})
+def test_copies(app: Sphinx, make_app: Callable[..., SphinxTestApp],
+                warning: StringIO) -> None:
+    app.build(force_all=True)
+    env_copy = app.outdir / 'environment.pickle'
+    source_copy = app.outdir / '_sources/guide/intro.rst.txt'
+    source_inode = source_copy.stat().st_ino
+    assert env_copy.read_bytes() == (app.doctreedir / 'environment.pickle').read_bytes()
+    exported = pickle.loads((app.outdir / 'environment-export.pickle').read_bytes())
+    assert set(exported) == {'all_docs', 'titles'}
+    assert 'guide/intro' in exported['titles']
+    assert 'no_such_attribute' in warning.getvalue()
+
+    (app.srcdir / 'guide/intro.rst').write_text(
+        (app.srcdir / 'guide/intro.rst').read_text(encoding='utf-8') + '\nMore text.\n',
+        encoding='utf-8')
+    rebuilt_app = make_app('json', srcdir=app.srcdir)
+    rebuilt_app.build()
+    # Changed files are copied again, and unchanged ones left alone.
+    assert env_copy.read_bytes() == (app.doctreedir / 'environment.pickle').read_bytes()
+    assert 'More text.' in source_copy.read_text(encoding='utf-8')
+    assert source_copy.stat().st_ino != source_inode
+    index_copy = app.outdir / '_sources/index.rst.txt'
+    index_inode = index_copy.stat().st_ino
+    make_app('json', srcdir=app.srcdir).build(force_all=True)
+    assert index_copy.stat().st_ino == index_inode
+
+
+@pytest.mark.sphinx('json', testroot='rewrites', srcdir='copies-hardlink', confoverrides={
+    'html_copy_method': 'hardlink',
+})
+def test_env_copy_not_hardlinked(app: Sphinx) -> None:
+    app.build(force_all=True)
+    # Sphinx rewrites its pickle in place, so the copy must be a file of its own.
+    env_copy = app.outdir / 'environment.pickle'
+    assert not env_copy.samefile(app.doctreedir / 'environment.pickle')
+    assert env_copy.read_bytes() == (app.doctreedir / 'environment.pickle').read_bytes()
+    source_copy = app.outdir / '_sources/guide/intro.rst.txt'
+    assert source_copy.samefile(app.srcdir / 'guide/intro.rst')
+
+
+@pytest.mark.sphinx('json', testroot='images', srcdir='hashed_images', confoverrides={
+    'html_hashed_images': True,
+    'html_image_store': '_store',
+})
+def test_hashed_images(app: Sphinx, make_app: Callable[..., SphinxTestApp]) -> None:
+    app.build(force_all=True)
+    logo = hashlib.sha256((app.srcdir / 'logo.png').read_bytes()).hexdigest()[:20] + '.png'
+    diagram = hashlib.sha256(
+        (app.srcdir / 'guide/diagram.png').read_bytes()).hexdigest()[:20] + '.png'
+    # The logo and its copy are the same image.
+    images = app.outdir / '_images'
+    assert sorted(p.name for p in images.iterdir()) == sorted([logo, diagram])
+    body = json.loads((app.outdir / 'guide.json').read_text(encoding='utf-8'))['body']
+    assert f'src="../_images/{logo}"' in body
+    assert f'src="../_images/{diagram}"' in body
+    # The down-scaled diagram links to the full size image.
+    body = json.loads((app.outdir / 'test-images.json').read_text(encoding='utf-8'))['body']
+    assert f'href="_images/{diagram}"' in body
+    assert 'diagram.png' not in body
+    # The output images are links to the images in the store.
+    store = app.srcdir / '_store'
+    assert (images / logo).stat().st_ino == (store / logo).stat().st_ino
+    mtime = (images / logo).stat().st_mtime_ns
+
+    (app.srcdir / 'guide/diagram.png').write_bytes((app.srcdir / 'logo.png').read_bytes())
+    make_app('json', srcdir=app.srcdir).build()
+    body = json.loads((app.outdir / 'guide.json').read_text(encoding='utf-8'))['body']
+    assert diagram not in body
+    assert (images / logo).stat().st_mtime_ns == mtime
+
+
+@pytest.mark.sphinx('json', testroot='toctree', srcdir='ndjson')
+def test_ndjson(app: Sphinx, make_app: Callable[..., SphinxTestApp]) -> None:
+    app.build(force_all=True)
+    stream_app = make_app('ndjson', srcdir=app.srcdir, builddir=app.srcdir / '_build_ndjson')
+    stream_app.build(force_all=True)
+    lines = (stream_app.outdir / 'pages.ndjson').read_bytes().splitlines()
+    # Each line holds what the JSON builder writes to the page's file.
+    pages = {json.loads(line)['current_page_name']: line for line in lines}
+    assert len(pages) == len(lines)
+    for filename in app.outdir.rglob('*.json'):
+        name = filename.relative_to(app.outdir).with_suffix('').as_posix()
+        if name in pages:
+            assert filename.read_bytes() == pages.pop(name), name
+    assert pages == {}
+    assert (stream_app.outdir / 'globalcontext.json').exists()
+    assert not (stream_app.outdir / 'api/client.json').exists()
+
+    # Incremental builds write every page to the stream again.
+    incremental_app = make_app('ndjson', srcdir=app.srcdir,
+                               builddir=app.srcdir / '_build_ndjson')
+    outdated = set(serializing_builder(incremental_app).get_outdated_docs())
+    assert outdated == set(app.env.found_docs)
+    incremental_app.build()
+    assert (stream_app.outdir / 'pages.ndjson').read_bytes().splitlines() == lines
+
+    rotated_app = make_app('ndjson', srcdir=app.srcdir, builddir=app.srcdir / '_build_ndjson',
+                           confoverrides={'html_ndjson_compression': 'gz',
+                                          'html_ndjson_max_size': 4096})
+    rotated_app.build(force_all=True)
+    parts = sorted(rotated_app.outdir.glob('pages*'))
+    assert len(parts) > 1
+    assert parts[0].name == 'pages-00001.ndjson.gz'
+    rotated: list[bytes] = []
+    for part in parts:
+        data = gzip.decompress(part.read_bytes())
+        # a part only goes over the limit if it holds a single page
+        assert len(data) <= 4096 or data.count(b'\n') == 1
+        rotated += data.splitlines()
+    assert rotated == lines
+    # The stream written before is replaced by the parts.
+    assert not (rotated_app.outdir / 'pages.ndjson').exists()